@@ -22,79 +22,283 @@
 """
 provide autosave functions
 
-allows a user to automatically save their files to /var/tmp/pyroom at a time
-period that is defined in the settings dialog (default is every 3 minutes)
+allows a user to automatically save their files to the snapshot store at a
+time period that is defined in the settings dialog (default is every 3
+minutes)
+
+the buffer text is copied out on the main thread and written by a separate
+thread, so a slow or full disk does not stall typing
 """
 
 import gobject
+import hashlib
 import os
 import tempfile
+import threading
+import Queue
 
 from pyroom_error import PyroomError
+import journal
+import scheduler
+import snapshots
 
-#Elapsed time in seconds, autosave in minutes.
-ELAPSED_TIME = 0 
+#Autosave in minutes, 0 disables it; set from the preferences
 AUTOSAVE_TIME = 3
+autosave_time = AUTOSAVE_TIME
 
 TEMP_FOLDER = tempfile.gettempdir()
-TIMEOUT_ID = 0
+TIMER = None
 
-FILE_UNNAMED = _('* Unnamed *')  
+# Buffers whose snapshot may wait for the writer at once
+QUEUE_SIZE = 8
 
+_writer = None
 
-def autosave_init(edit_instance, mill=1000):
-    """Init the internal autosave timer"""
-    global ELAPSED_TIME
-    global TIMEOUT_ID
-    TIMEOUT_ID = gobject.timeout_add(mill, timeout, edit_instance)
-    ELAPSED_TIME = 0
+FILE_UNNAMED = _('* Unnamed *')  
 
 
-def save_file(filename, text):
-    """save text fo filename"""
-    try:
-        out_file = open(filename, "w")
-        out_file.write(text)
-        out_file.close()
-    except IOError:
-        raise PyroomError(_("Could not autosave file %s") % filename)
+def autosave_init(edit_instance):
+    """Init the internal autosave timer, armed by the first edit"""
+    global TIMER
+    TIMER = scheduler.Timer(timeout, edit_instance)
+
 
 def autosave_quit():
     """dispose the internal timer"""
-    gobject.source_remove(TIMEOUT_ID)
+    if TIMER is not None:
+        TIMER.cancel()
+
+
+def track_buffer(buf):
+    """count the edits made to buf, so clean buffers can be skipped"""
+    buf.generation = 0
+    buf.saved_generation = 0
+    buf.autosaved_generation = 0
+    buf.autosaved_hash = None
+    buf.autosave_pending = False
+    buf.snapshot = None
+    buf.saves_pending = 0
+    buf.generation_handler = buf.connect('changed', bump_generation)
+    buf.connect('modified-changed', modified_changed)
+
+
+def freeze(buf):
+    """keep the generations while the text is taken out and put back as it
+    was, as hibernation does"""
+    buf.handler_block(buf.generation_handler)
+
+
+def thaw(buf):
+    """count the edits again"""
+    buf.handler_unblock(buf.generation_handler)
+
+
+def bump_generation(buf):
+    """the buffer content changed, an autosave is due"""
+    buf.generation += 1
+    if TIMER is not None and int(autosave_time) and not TIMER.armed():
+        TIMER.arm(int(autosave_time) * 60)
+
+
+def modified_changed(buf):
+    """a buffer no longer modified holds what was last loaded or saved"""
+    if not buf.get_modified():
+        buf.saved_generation = buf.generation
+
+
+def is_dirty(buf):
+    """whether buf has edits that are not saved, without copying its text
+
+    a paged buffer only holds a window of its file and is never saved"""
+    return (not buf.loader and not buf.pager and buf.get_modified()
+            and buf.generation != buf.saved_generation)
+
+
+def needs_autosave(buf):
+    """whether buf has been edited since it was last saved or autosaved
+
+    a buffer still loading, waiting to be loaded or paged does not hold
+    its whole file yet"""
+    return (not (buf.loader or buf.pending_load or buf.pager)
+            and buf.get_modified()
+            and buf.generation != buf.autosaved_generation)
+
+
+def write_snapshot(buf, callback=None):
+    """queue a snapshot of buf, unless the last one holds or is about to
+    hold the same text
+
+    callback(buf) is called from the main loop once it has been written;
+    returns whether anything was queued"""
+    text = buf.get_text(buf.get_start_iter(), buf.get_end_iter())
+    text_hash = hashlib.md5(text).digest()
+    if text_hash == buf.autosaved_hash:
+        buf.autosaved_generation = buf.generation
+        if not buf.autosave_pending:
+            # the snapshot already holds everything the journal recorded
+            buf.journal.rebase(buf.snapshot)
+        return False
+    global _writer
+    if _writer is None:
+        _writer = SnapshotWriter()
+        _writer.start()
+    if buf.filename == FILE_UNNAMED:
+        source = ''
+    else:
+        source = os.path.abspath(buf.filename)
+    job = (source, text, callback)
+    if not _writer.queue(buf, job):
+        # the writer is backed up, try again at the next interval
+        if TIMER is not None and int(autosave_time):
+            TIMER.arm(int(autosave_time) * 60)
+        return False
+    buf.autosaved_generation = buf.generation
+    buf.autosaved_hash = text_hash
+    buf.autosave_pending = True
+    # edits from now on are not part of the snapshot
+    buf.journal.mark()
+    return True
+
+
+def snapshot_written(buf, manifest, error, superseded, callback):
+    """a queued snapshot is on disk, or could not be written"""
+    if error is not None:
+        buf.autosaved_hash = None
+        buf.autosaved_generation = None
+        buf.autosave_pending = superseded
+        raise error
+    buf.snapshot = manifest
+    if not superseded:
+        buf.autosave_pending = False
+        # unless the journal was rebased meanwhile, by a save for instance
+        if buf.journal.carried is not None and not buf.hibernated:
+            buf.journal.rebase(manifest, carry=True)
+    if callback:
+        callback(buf)
+    return False
+
+
+class SnapshotWriter(threading.Thread):
+    """writes autosave snapshots, only the latest one of each buffer"""
+
+    def __init__(self):
+        threading.Thread.__init__(self, name='pyroom-autosave')
+        self.setDaemon(True)
+        self.buffers = Queue.Queue(QUEUE_SIZE)
+        self.jobs = {}
+        self.snapshots = {}
+        self.lock = threading.Lock()
+
+    def queue(self, buf, job):
+        """hand a snapshot over, returns False when the queue is full"""
+        self.lock.acquire()
+        try:
+            if buf in self.jobs:
+                # the older snapshot has not been written yet, drop it
+                self.jobs[buf] = job
+                return True
+            try:
+                self.buffers.put_nowait(buf)
+            except Queue.Full:
+                return False
+            self.jobs[buf] = job
+            self.snapshots.setdefault(buf, None)
+            return True
+        finally:
+            self.lock.release()
+
+    def forget(self, buf):
+        """buf is closed, its snapshots need not be kept"""
+        self.lock.acquire()
+        try:
+            self.jobs.pop(buf, None)
+            self.snapshots.pop(buf, None)
+        finally:
+            self.lock.release()
+
+    def run(self):
+        while True:
+            buf = self.buffers.get()
+            self.lock.acquire()
+            try:
+                job = self.jobs.pop(buf, None)
+            finally:
+                self.lock.release()
+            if job is None:
+                # forgotten
+                continue
+            source, text, callback = job
+            manifest = None
+            error = None
+            try:
+                manifest = snapshots.store(source, text)
+            except (IOError, OSError):
+                error = PyroomError(_("Could not autosave file %s")
+                                    % (source or FILE_UNNAMED))
+            else:
+                self.lock.acquire()
+                try:
+                    forgotten = buf not in self.snapshots
+                    if not forgotten:
+                        self.snapshots[buf] = manifest
+                    protect = set(self.snapshots.values())
+                finally:
+                    self.lock.release()
+                if forgotten:
+                    # closed while it was written, nothing to recover
+                    try:
+                        snapshots.dismiss([os.path.basename(manifest)])
+                    except (IOError, OSError):
+                        pass
+                protect.update(journal.bases())
+                try:
+                    if snapshots.prune_due():
+                        snapshots.prune(protect)
+                except (IOError, OSError):
+                    # another pyroom may be pruning too, try again next time
+                    pass
+            self.lock.acquire()
+            try:
+                superseded = buf in self.jobs
+            finally:
+                self.lock.release()
+            gobject.idle_add(snapshot_written, buf, manifest, error,
+                             superseded, callback)
+
+
+def forget_buffer(buf):
+    """buf is closed"""
+    if _writer is not None:
+        _writer.forget(buf)
+
+
+def dismiss(buf):
+    """the edits of buf are thrown away, do not offer to recover them"""
+    forget_buffer(buf)
+    if buf.filename != FILE_UNNAMED:
+        try:
+            snapshots.dismiss_sources([os.path.abspath(buf.filename)])
+        except (IOError, OSError):
+            pass
 
 
 def autosave_file(edit_instance, buf_id):
-    """AutoSave the Buffer to temp folder"""
-    buf = edit_instance.buffers[buf_id]
-    if not os.path.isdir(TEMP_FOLDER):
-        os.mkdir(TEMP_FOLDER)
-
-    if not hasattr(buf, 'tmp_filename'):
-        if buf.filename == FILE_UNNAMED:
-            buf.tmp_filename = tempfile.mkstemp(suffix="",
-                prefix="noname_tmp_", dir=TEMP_FOLDER, text=True)[1]
-        else:
-            buf_name = os.path.split(buf.filename)[1]
-            buf.tmp_filename = tempfile.mkstemp(suffix="",
-                prefix = buf_name + "_tmp_", dir=TEMP_FOLDER, text=True)[1]
-    save_file(buf.tmp_filename, buf.get_text(buf.get_start_iter(),
-        buf.get_end_iter()))
-    edit_instance.status.set_text(_('AutoSaving Buffer %(buf_id)d, to temp\
-     file %(buf_tmp_filename)s') % {'buf_id': buf_id, 
-                   'buf_tmp_filename': buf.tmp_filename})
+    """AutoSave the Buffer to the snapshot store"""
+    write_snapshot(edit_instance.buffers[buf_id],
+                   lambda buf: autosave_done(edit_instance, buf))
+
+
+def autosave_done(edit_instance, buf):
+    """report a finished autosave"""
+    if buf in edit_instance.buffers:
+        edit_instance.status.set_text(_('AutoSaving Buffer %(buf_id)d, to \
+snapshot %(snapshot)s') % {
+            'buf_id': edit_instance.buffers.index(buf),
+            'snapshot': os.path.basename(buf.snapshot)})
 
 def timeout(edit_instance):
-    "the Timer Function"
-    global ELAPSED_TIME
-
-    if int(AUTOSAVE_TIME) != 0:
-        ELAPSED_TIME += 1
-        if ELAPSED_TIME >= int(AUTOSAVE_TIME) * 60:
-            for buf in edit_instance.buffers:
-                autosave_file(edit_instance, 
-                    edit_instance.buffers.index(buf))
-            ELAPSED_TIME = 0
-        return True # continue repeat timeout event
-    else:
-        return False #stop timeout event
+    "the Timer Function, edits after this arm it again"
+    if int(autosave_time) != 0:
+        for buf_id, buf in enumerate(edit_instance.buffers):
+            if needs_autosave(buf):
+                autosave_file(edit_instance, buf_id)
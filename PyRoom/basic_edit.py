@@ -25,21 +25,39 @@ contains basic functions needed for pyroom - any core functionality is included
 within this file
 """
 
+import gobject
 import gtk
-import gtk.glade
 import gtksourceview
 import os
+import time
 
 from pyroom_error import PyroomError
 from gui import GUI
 from preferences import Preferences
+from dialogs import DialogFactory
+import startup_trace
+import hibernate
 import autosave
+import snapshots
+import navigation
+from search import SearchBar, FindAllDialog
+from loader import ChunkedLoader
+import pager
+import saver
+from statistics import BufferStatistics, WordIndex
+from journal import Journal
 
 FILE_UNNAMED = _('* Unnamed *')
 
 KEY_BINDINGS = '\n'.join([
 _('Control-H: Show help in a new buffer'),
 _('Control-I: Show buffer information'),
+_('Control-G: Go to a line, a percentage or a paragraph (p12)'),
+_('Control-F: Find, Enter for the next match, Shift-Enter the previous'),
+_('Control-Shift-F: Find in all buffers'),
+_('Control-R: Replace, Enter replaces once, Control-Enter all'),
+_('Control-B: Set or remove a bookmark on the current line'),
+_('Control-J: Jump to the next bookmark'),
 _('Control-P: Shows Preferences dialog'),
 _('Control-N: Create a new buffer'),
 _('Control-O: Open a file in a new buffer'),
@@ -50,7 +68,8 @@ _('Control-W: Close buffer and exit if it was the last buffer'),
 _('Control-Y: Redo last typing'),
 _('Control-Z: Undo last typing'),
 _('Control-Page Up: Switch to previous buffer'),
-_('Control-Page Down: Switch to next buffer'), ])
+_('Control-Page Down: Switch to next buffer'),
+_('Escape: Cancel loading of the current file'), ])
 
 HELP = \
     _("""PyRoom - distraction free writing
@@ -80,12 +99,17 @@ def define_keybindings(edit_instance):
     basic_bindings = {
         gtk.keysyms.Page_Up: edit_instance.prev_buffer,
         gtk.keysyms.Page_Down: edit_instance.next_buffer,
+        gtk.keysyms.B: edit_instance.toggle_bookmark,
+        gtk.keysyms.F: edit_instance.show_find,
+        gtk.keysyms.G: edit_instance.show_goto,
         gtk.keysyms.H: edit_instance.show_help,
         gtk.keysyms.I: edit_instance.show_info,
+        gtk.keysyms.J: edit_instance.next_bookmark,
         gtk.keysyms.N: edit_instance.new_buffer,
         gtk.keysyms.O: edit_instance.open_file,
         gtk.keysyms.P: edit_instance.preferences.show,
         gtk.keysyms.Q: edit_instance.dialog_quit,
+        gtk.keysyms.R: edit_instance.show_replace,
         gtk.keysyms.S: edit_instance.save_file,
         gtk.keysyms.W: edit_instance.close_dialog,
         gtk.keysyms.Y: edit_instance.redo,
@@ -103,11 +127,35 @@ class BasicEdit(object):
     def __init__(self, style, pyroom_config):
         self.current = 0
         self.buffers = []
+        self.word_index = WordIndex()
+        self.project = None
+        self.watchdog = None
+        self.failed_saves = 0
         self.style = style
         self.config = pyroom_config.config
+        self.prefetch_buffers = int(self.config.get('editor', 'prefetch'))
+        self.prefetch_id = 0
+        self.memory_budget = int(self.config.get('editor',
+            'memorybudget')) * 1024 * 1024
+        self.budget_id = 0
+        self.pager_threshold = int(self.config.get('editor',
+            'pagerthreshold')) * 1024 * 1024
+        snapshots.keep_count = int(self.config.get('editor', 'historycount'))
+        snapshots.max_age = int(self.config.get('editor',
+            'historydays')) * 24 * 60 * 60
+        snapshots.max_bytes = int(self.config.get('editor',
+            'historysize')) * 1024 * 1024
+        startup_trace.begin('GUI')
         self.gui = GUI(style, pyroom_config, self)
+        startup_trace.end('GUI')
+        startup_trace.begin('glade')
+        self.dialogs = DialogFactory(os.path.join(
+            pyroom_config.pyroom_absolute_path, "interface.glade"))
+        startup_trace.end('glade')
+        startup_trace.begin('Preferences')
         self.preferences = Preferences(gui=self.gui, style=style,
-            pyroom_config=pyroom_config)
+            pyroom_config=pyroom_config, dialogs=self.dialogs)
+        startup_trace.end('Preferences')
         self.status = self.gui.status
         self.window = self.gui.window
         self.textbox = self.gui.textbox
@@ -115,6 +163,14 @@ class BasicEdit(object):
         self.new_buffer()
 
         self.textbox.connect('key-press-event', self.key_press_event)
+        self.gui.scrolled.get_vadjustment().connect('value-changed',
+                                                    self.view_scrolled)
+        self.goto_entry = self.gui.goto_entry
+        self.goto_entry.connect('activate', self.goto_activated)
+        self.goto_entry.connect('key-press-event', self.goto_key_press)
+        self.goto_entry.connect('focus-out-event', self.hide_goto)
+        self.search_bar = SearchBar(self)
+        self.find_all = FindAllDialog(self)
 
         # Set line numbers visible, set linespacing
         self.textbox.set_show_line_numbers(int(self.config.get("visual",
@@ -141,31 +197,6 @@ class BasicEdit(object):
           max_height=monitor_geometry.height
         )
 
-        # Defines the glade file functions for use on closing a buffer
-        self.wTree = gtk.glade.XML(os.path.join(
-            pyroom_config.pyroom_absolute_path, "interface.glade"),
-            "SaveBuffer")
-        self.dialog = self.wTree.get_widget("SaveBuffer")
-        self.dialog.set_transient_for(self.window)
-        dic = {
-                "on_button-close_clicked": self.unsave_dialog,
-                "on_button-cancel_clicked": self.cancel_dialog,
-                "on_button-save_clicked": self.save_dialog,
-                }
-        self.wTree.signal_autoconnect(dic)
-
-        #Defines the glade file functions for use on exit
-        self.aTree = gtk.glade.XML(os.path.join(
-            pyroom_config.pyroom_absolute_path, "interface.glade"),
-            "QuitSave")
-        self.quitdialog = self.aTree.get_widget("QuitSave")
-        self.quitdialog.set_transient_for(self.window)
-        dic = {
-                "on_button-close2_clicked": self.quit_quit,
-                "on_button-cancel2_clicked": self.cancel_quit,
-                "on_button-save2_clicked": self.save_quit,
-                }
-        self.aTree.signal_autoconnect(dic)
         self.keybindings = define_keybindings(self)
 
     def key_press_event(self, widget, event):
@@ -175,28 +206,68 @@ class BasicEdit(object):
                 if self.keybindings[event.hardware_keycode] == self.save_file\
                     and event.state & gtk.gdk.SHIFT_MASK:
                     self.save_file_as()
+                elif self.keybindings[event.hardware_keycode] == \
+                    self.show_find and event.state & gtk.gdk.SHIFT_MASK:
+                    self.find_all.show()
                 else:
                     self.keybindings[event.hardware_keycode]()
                 return True
+        elif event.keyval == gtk.keysyms.Escape:
+            self.cancel_loading()
         return False
 
     def show_info(self):
         """ Display buffer information on status label for 5 seconds """
 
         buf = self.buffers[self.current]
-        if buf.can_undo() or buf.can_redo():
-            status = _(' (modified)')
+        if buf.pager:
+            self.status.set_text(_('Buffer %(buffer_id)d: %(buffer_name)s \
+(read-only), %(size)d byte(s), %(lines)d line(s)') % {
+                'buffer_id': self.current + 1,
+                'buffer_name': buf.filename,
+                'size': buf.pager.size,
+                'lines': buf.pager.total_lines(),
+                }, 5000)
         else:
-            status = ''
-        self.status.set_text(_('Buffer %(buffer_id)d: %(buffer_name)s\
+            if autosave.is_dirty(buf):
+                status = _(' (modified)')
+            else:
+                status = ''
+            self.status.set_text(_('Buffer %(buffer_id)d: %(buffer_name)s\
 %(status)s, %(char_count)d byte(s), %(word_count)d word(s)\
 , %(lines)d line(s)') % {
-            'buffer_id': self.current + 1,
-            'buffer_name': buf.filename,
-            'status': status,
-            'char_count': buf.get_char_count(),
-            'word_count': self.word_count(buf),
-            'lines': buf.get_line_count(),
+                'buffer_id': self.current + 1,
+                'buffer_name': buf.filename,
+                'status': status,
+                'char_count': buf.get_char_count(),
+                'word_count': self.word_count(buf),
+                'lines': buf.get_line_count(),
+                }, 5000)
+            if self.project:
+                self.show_project_info()
+        if self.watchdog:
+            self.status.set_text('%s; %s' % (self.status.get_text(),
+                                 self.watchdog.summary()), 5000)
+
+    def show_project_info(self):
+        """ Add the project totals to the status, counting the files being
+        edited as they are in their buffers """
+        self.project.scan()
+        edited = {}
+        for buf in self.buffers:
+            if autosave.is_dirty(buf) and not buf.hibernated:
+                edited[os.path.abspath(buf.filename)] = (
+                    buf.get_char_count(), self.word_count(buf),
+                    buf.get_line_count())
+        files, chars, words, lines = self.project.totals(edited)
+        self.status.set_text(self.status.get_text() + _('; project \
+%(project)s: %(files)d file(s), %(char_count)d byte(s), %(word_count)d \
+word(s), %(lines)d line(s)') % {
+            'project': os.path.basename(self.project.root),
+            'files': files,
+            'char_count': chars,
+            'word_count': words,
+            'lines': lines,
             }, 5000)
 
     def undo(self):
@@ -232,91 +303,336 @@ class BasicEdit(object):
         chooser.set_default_response(gtk.RESPONSE_OK)
 
         res = chooser.run()
+        filename = chooser.get_filename()
+        chooser.destroy()
         if res == gtk.RESPONSE_OK:
-            buf = self.new_buffer()
-            buf.filename = chooser.get_filename()
-            try:
-                buffer_file = open(buf.filename, 'r')
-                buf = self.buffers[self.current]
-                buf.begin_not_undoable_action()
-                utf8 = unicode(buffer_file.read(), 'utf-8')
-                buf.set_text(utf8)
-                buf.end_not_undoable_action()
-                buffer_file.close()
-                self.status.set_text(_('File %s open')
-                         % buf.filename)
-            except IOError, (errno, strerror):
-                errortext = _('Unable to open %(filename)s.' % {
-                                'filename': buf.filename})
-                if errno == 2:
-                    errortext += _(' The file does not exist.')
-                elif errno == 13:
-                    errortext += _(' You do not have permission to \
-open the file.')
-                raise PyroomError(errortext)
-            except:
-                raise PyroomError(_('Unable to open %s\n'
-                                 % buf.filename))
+            self.open_file_no_chooser(filename)
         else:
             self.status.set_text(_('Closed, no files selected'))
-        chooser.destroy()
 
-    def open_file_no_chooser(self, filename):
-        """ Open specified file """
+    def open_file_no_chooser(self, filename, lazy=False):
+        """ Open specified file, streaming it in from idle callbacks
+
+        lazy files only get a placeholder buffer, loaded when it is first
+        switched to """
         buf = self.new_buffer()
         buf.filename = filename
+        buf.journal.pause()
+        if lazy:
+            try:
+                buf.file_size = os.stat(filename).st_size
+            except OSError, (errno, strerror):
+                self.open_failed(filename, errno)
+            buf.pending_load = True
+        else:
+            self.start_loading(buf, self.status)
+
+    def start_loading(self, buf, status=None):
+        """ Stream the file of buf into it, reporting progress on status """
+        buf.pending_load = False
         try:
-            buffer_file = open(buf.filename, 'r')
-            buf = self.buffers[self.current]
-            buf.begin_not_undoable_action()
-            utf8 = unicode(buffer_file.read(), 'utf-8')
-            buf.set_text(utf8)
-            buf.end_not_undoable_action()
-            buffer_file.close()
-            self.status.set_text(_('File %s open')
-                     % buf.filename)
-        except IOError, (errno, strerror):
-            errortext = _('Unable to open %(filename)s.' % {
-                'filename': buf.filename})
-            if errno == 2:
-                errortext += _(' The file does not exist.')
-            elif errno == 13:
-                errortext += _(' You do not have permission to open \
-the file.')
-            raise PyroomError(errortext)
+            if (self.pager_threshold and
+                os.path.getsize(buf.filename) >= self.pager_threshold):
+                file_loader = pager.Pager(buf, buf.filename, status)
+            else:
+                file_loader = ChunkedLoader(buf, buf.filename, status,
+                                            self.file_loaded)
+        except (IOError, OSError), (errno, strerror):
+            self.open_failed(buf.filename, errno)
         except:
             raise PyroomError(_('Unable to open %s\n'
                              % buf.filename))
-    def save_file(self):
-        """ Save file """
+        file_loader.start()
+        if buf is self.buffers[self.current]:
+            self.textbox.set_editable(not (buf.pager or buf.loader))
+
+    def view_scrolled(self, adjustment):
+        """ Move the window of a paged buffer along with the view """
+        buf = self.buffers[self.current]
+        if buf.pager:
+            buf.pager.scrolled(self.textbox, adjustment)
+
+    def open_failed(self, filename, errno):
+        """ Explain why filename could not be opened """
+        errortext = _('Unable to open %(filename)s.' % {
+            'filename': filename})
+        if errno == 2:
+            errortext += _(' The file does not exist.')
+        elif errno == 13:
+            errortext += _(' You do not have permission to open \
+the file.')
+        raise PyroomError(errortext)
+
+    def prefetch(self):
+        """ Start loading the placeholder buffers next to the current one """
+        self.prefetch_id = 0
+        for index in (self.current + 1, self.current - 1):
+            buf = self.buffers[index % len(self.buffers)]
+            if buf.pending_load:
+                self.start_loading(buf)
+        return False
+
+    def file_loaded(self, buf, complete):
+        """ Journal edits against the freshly loaded file """
+        if complete:
+            buf.journal.rebase(buf.filename)
+            navigation.load_bookmarks(buf)
+        if buf is self.textbox.get_buffer():
+            self.textbox.set_editable(not buf.pager)
+
+    def show_find(self):
+        """ Open the find bar """
+        self.search_bar.show()
+
+    def show_replace(self):
+        """ Open the find and replace bar """
+        self.search_bar.show(replace=True)
+
+    def show_goto(self):
+        """ Ask for a line, percentage or paragraph to go to """
+        self.goto_entry.set_text('')
+        self.goto_entry.show()
+        self.goto_entry.grab_focus()
+
+    def hide_goto(self, widget=None, event=None):
+        """ Give the focus back to the text """
+        self.goto_entry.hide()
+        self.textbox.grab_focus()
+        return False
+
+    def goto_key_press(self, widget, event):
+        """ Escape leaves the goto entry """
+        if event.keyval == gtk.keysyms.Escape:
+            self.hide_goto()
+            return True
+        return False
+
+    def goto_activated(self, entry):
+        """ Go where the goto entry says """
+        position = navigation.parse_position(
+            unicode(entry.get_text(), 'utf-8'))
+        if position is None:
+            self.status.set_text(_('Type a line number, a percentage or p \
+and a paragraph number'))
+            return
+        self.hide_goto()
+        self.go_to(self.buffers[self.current], *position)
+
+    def go_to(self, buf, kind, value):
+        """ Move the cursor to a line, percentage or paragraph """
+        if buf.pager:
+            if kind == 'paragraph':
+                self.status.set_text(_('Paragraphs are not counted in \
+read-only files'))
+                return
+            if kind == 'percent':
+                value = int(buf.pager.total_lines() * value / 100) + 1
+            line = max(0, value - 1)
+            if not buf.pager.show(max(0, line - pager.WINDOW_LINES / 2)):
+                self.status.set_text(_('Line %d has not been indexed yet')
+                                     % value)
+                return
+            text_iter = buf.get_iter_at_line(line - buf.pager.first)
+        else:
+            text_iter = navigation.position_iter(buf, kind, value)
+        buf.place_cursor(text_iter)
+        self.textbox.scroll_to_mark(buf.get_insert(), 0.0, True, 0.0, 0.3)
+
+    def toggle_bookmark(self):
+        """ Set or remove a bookmark on the line of the cursor """
+        buf = self.buffers[self.current]
+        if buf.pager:
+            self.status.set_text(_('File %s is read-only, no bookmarks')
+                                 % buf.filename)
+            return
+        line = buf.get_iter_at_mark(buf.get_insert()).get_line()
+        if navigation.toggle_bookmark(buf, line):
+            self.status.set_text(_('Bookmark set on line %d') % (line + 1))
+        else:
+            self.status.set_text(_('Bookmark removed from line %d')
+                                 % (line + 1))
+        if not autosave.is_dirty(buf):
+            self.store_bookmarks(buf, buf.filename)
+
+    def next_bookmark(self):
+        """ Move the cursor to the next bookmark """
+        buf = self.buffers[self.current]
+        line = navigation.next_bookmark(buf,
+            buf.get_iter_at_mark(buf.get_insert()).get_line())
+        if line is None:
+            self.status.set_text(_('No bookmarks in this buffer'))
+        else:
+            self.go_to(buf, 'line', line + 1)
+
+    def store_bookmarks(self, buf, filename):
+        """ Keep the bookmarks of a buffer matching filename """
+        try:
+            navigation.save_bookmarks(buf, filename)
+        except (IOError, OSError):
+            self.status.set_text(_('Unable to store the bookmarks of %s')
+                                 % filename)
+
+    def offer_recovery(self, entries):
+        """ Ask whether to reopen the autosaves newer than their files """
+        lines = []
+        for name, stamp, size, digest, flags, source in entries:
+            lines.append(_('%(filename)s, autosaved %(time)s') % {
+                'filename': source,
+                'time': time.strftime('%c', time.localtime(stamp))})
+        dialog = gtk.MessageDialog(parent=self.window, flags=gtk.DIALOG_MODAL,
+            type=gtk.MESSAGE_QUESTION, buttons=gtk.BUTTONS_NONE,
+            message_format=_('PyRoom has autosaves newer than these \
+files:\n\n%s\n\nDo you want to recover them?') % '\n'.join(lines))
+        dialog.add_button(_('Ignore'), gtk.RESPONSE_REJECT)
+        dialog.add_button(_('Recover'), gtk.RESPONSE_ACCEPT)
+        dialog.set_default_response(gtk.RESPONSE_ACCEPT)
+        res = dialog.run()
+        dialog.destroy()
+        if res == gtk.RESPONSE_ACCEPT:
+            for entry in entries:
+                self.open_snapshot(os.path.join(snapshots.MANIFEST_FOLDER,
+                                                entry[0]), entry[5])
+            self.status.set_text(_('Recovered %d autosave(s)') % len(entries))
+        elif res == gtk.RESPONSE_REJECT:
+            snapshots.dismiss([entry[0] for entry in entries])
+        return False
+
+    def open_snapshot(self, manifest, filename):
+        """ Open an autosave snapshot of filename as a modified buffer """
         try:
-            buf = self.buffers[self.current]
-            if buf.filename != FILE_UNNAMED:
-                buffer_file = open(buf.filename, 'w')
-                txt = buf.get_text(buf.get_start_iter(),
-                                     buf.get_end_iter())
-                buffer_file.write(txt)
-                buffer_file.close()
-                buf.begin_not_undoable_action()
-                buf.end_not_undoable_action()
-                self.status.set_text(_('File %s saved') % buf.filename)
+            text = snapshots.load(manifest)
+        except IOError:
+            raise PyroomError(_('Unable to recover the autosave of %s')
+                              % filename)
+        buf = self.new_buffer()
+        buf.journal.pause()
+        buf.begin_not_undoable_action()
+        buf.set_text(unicode(text, 'utf-8'))
+        buf.end_not_undoable_action()
+        buf.place_cursor(buf.get_start_iter())
+        buf.filename = filename
+        buf.snapshot = manifest
+        buf.set_modified(True)
+        buf.journal.rebase(manifest)
+
+    def cancel_loading(self):
+        """ Stop loading the file of the current buffer """
+        buf = self.buffers[self.current]
+        if buf.loader:
+            buf.loader.cancel()
+
+    def save_file(self, on_saved=None):
+        """ Save file in the background, on_saved(buf) is called once it
+        is written """
+        buf = self.buffers[self.current]
+        if buf.loader:
+            self.status.set_text(_('File %s is still loading, not saved')
+                                 % buf.filename)
+        elif buf.pager:
+            self.status.set_text(_('File %s is read-only, not saved')
+                                 % buf.filename)
+        elif buf.filename != FILE_UNNAMED:
+            saver.save(buf.filename, saver.buffer_chunks(buf),
+                self.save_finished, int(self.config.get('editor', 'fsync')),
+                buf, buf.generation, on_saved)
+            buf.saves_pending += 1
+            buf.begin_not_undoable_action()
+            buf.end_not_undoable_action()
+            buf.set_modified(False)
+            self.status.set_text(_('Saving %s') % buf.filename)
+        else:
+            self.save_file_as(on_saved)
+
+    def save_finished(self, filename, error, buf, generation, on_saved=None):
+        """ Report the outcome of a background save """
+        if self.buffer_saved(filename, error, buf, generation):
+            self.status.set_text(_('File %s saved') % filename)
+            if on_saved:
+                on_saved(buf)
+            return False
+        raise PyroomError(self.save_error_text(filename, error))
+
+    def buffer_saved(self, filename, error, buf, generation):
+        """ Journal against the saved file, or mark buf modified again if
+        it could not be written; returns whether it was """
+        buf.saves_pending -= 1
+        if error is None:
+            if buf.generation == generation:
+                buf.journal.rebase(filename)
+                self.store_bookmarks(buf, filename)
             else:
-                self.save_file_as()
-        except IOError, (errno, strerror):
-            errortext = _('Unable to save %(filename)s.' % {
-                'filename': buf.filename})
-            if errno == 13:
-                errortext += _(' You do not have permission to write to \
+                autosave.write_snapshot(buf)
+            return True
+        buf.saved_generation = None
+        buf.set_modified(True)
+        self.failed_saves += 1
+        return False
+
+    def save_error_text(self, filename, error):
+        """ Explain why filename could not be saved """
+        errortext = _('Unable to save %(filename)s.' % {
+            'filename': filename})
+        if error.errno == 13:
+            errortext += _(' You do not have permission to write to \
 the file.')
-            raise PyroomError(errortext)
-        except:
-            raise PyroomError(_('Unable to save %s\n'
-                            % buf.filename))
+        return errortext
+
+    def save_all(self, callback=None):
+        """ Save every modified buffer at once, then call callback
+
+        unnamed buffers are given a filename first, all of them are then
+        written concurrently """
+        dirty = [buf for buf in self.buffers if autosave.is_dirty(buf)
+                 and (buf.get_char_count() or buf.filename != FILE_UNNAMED)]
+        for buf in dirty:
+            if buf.filename == FILE_UNNAMED:
+                self.set_buffer(self.buffers.index(buf))
+                filename = self.choose_filename(buf)
+                if filename is None:
+                    self.status.set_text(_('Closed, no files selected'))
+                    return
+                buf.filename = filename
+        jobs = []
+        generations = []
+        for buf in dirty:
+            jobs.append((buf.filename, saver.buffer_chunks(buf)))
+            generations.append(buf.generation)
+            buf.saves_pending += 1
+            buf.begin_not_undoable_action()
+            buf.end_not_undoable_action()
+            buf.set_modified(False)
+        self.status.set_text(_('Saving %d file(s)') % len(jobs))
+        saver.save_all(jobs, self.save_all_finished,
+            int(self.config.get('editor', 'fsync')), dirty, generations,
+            callback)
+
+    def save_all_finished(self, results, buffers, generations, callback):
+        """ Report the outcome of save_all in one go """
+        errors = []
+        for (filename, error), buf, generation in zip(results, buffers,
+                                                      generations):
+            if not self.buffer_saved(filename, error, buf, generation):
+                errors.append(self.save_error_text(filename, error))
+        if errors:
+            raise PyroomError('\n'.join(errors))
+        self.status.set_text(_('%d file(s) saved') % len(results))
+        if callback:
+            callback()
+        return False
 
-    def save_file_as(self):
+    def save_file_as(self, on_saved=None):
         """ Save file as """
 
         buf = self.buffers[self.current]
+        filename = self.choose_filename(buf)
+        if filename is not None:
+            buf.filename = filename
+            self.save_file(on_saved)
+        else:
+            self.status.set_text(_('Closed, no files selected'))
+
+    def choose_filename(self, buf):
+        """ Ask where to save buf, None if cancelled """
         chooser = gtk.FileChooserDialog('PyRoom', self.window,
                 gtk.FILE_CHOOSER_ACTION_SAVE,
                 buttons=(gtk.STOCK_CANCEL, gtk.RESPONSE_CANCEL,
@@ -325,32 +641,24 @@ the file.')
         if buf.filename != FILE_UNNAMED:
             chooser.set_filename(buf.filename)
         res = chooser.run()
-        if res == gtk.RESPONSE_OK:
-            buf.filename = chooser.get_filename()
-            self.save_file()
-        else:
-            self.status.set_text(_('Closed, no files selected'))
+        filename = chooser.get_filename()
         chooser.destroy()
+        if res == gtk.RESPONSE_OK:
+            return filename
+        return None
 
     def word_count(self, buf):
         """ Word count in a text buffer """
-
-        iter1 = buf.get_start_iter()
-        iter2 = iter1.copy()
-        iter2.forward_word_end()
-        count = 0
-        while iter2.get_offset() != iter1.get_offset():
-            count += 1
-            iter1 = iter2.copy()
-            iter2.forward_word_end()
-        return count
+        return buf.statistics.words
 
     def show_help(self):
         """ Create a new buffer and inserts help """
         buf = self.new_buffer()
+        buf.journal.pause()
         buf.begin_not_undoable_action()
         buf.set_text(HELP)
         buf.end_not_undoable_action()
+        buf.set_modified(False)
         self.status.set_text("Displaying help. Press control W to exit and \
 continue editing your document.")
 
@@ -361,33 +669,64 @@ continue editing your document.")
         buf.set_check_brackets(False)
         buf.set_highlight(False)
         buf.filename = FILE_UNNAMED
+        buf.loader = None
+        buf.pager = None
+        buf.pending_load = False
+        buf.bookmarks = []
+        buf.hibernated = None
+        buf.last_used = time.time()
+        buf.statistics = BufferStatistics(buf, self.word_index)
+        autosave.track_buffer(buf)
+        buf.journal = Journal(buf)
         self.buffers.insert(self.current + 1, buf)
         buf.place_cursor(buf.get_end_iter())
         self.next_buffer()
         return buf
 
+    def get_save_dialog(self):
+        """the dialog used on closing a modified buffer"""
+        return self.dialogs.get_dialog("SaveBuffer", {
+                "on_button-close_clicked": self.unsave_dialog,
+                "on_button-cancel_clicked": self.cancel_dialog,
+                "on_button-save_clicked": self.save_dialog,
+                }, self.window)
+
+    def get_quit_dialog(self):
+        """the dialog used on exit with modified buffers"""
+        return self.dialogs.get_dialog("QuitSave", {
+                "on_button-close2_clicked": self.quit_quit,
+                "on_button-cancel2_clicked": self.cancel_quit,
+                "on_button-save2_clicked": self.save_quit,
+                }, self.window)
+
     def close_dialog(self):
         """ask for confirmation if there are unsaved contents"""
         buf = self.buffers[self.current]
-        if buf.can_undo() or buf.can_redo():
-            self.dialog.show()
+        if autosave.is_dirty(buf):
+            self.get_save_dialog().show()
         else:
             self.close_buffer()
 
     def cancel_dialog(self, widget, data=None):
         """dialog has been canceled"""
-        self.dialog.hide()
+        self.get_save_dialog().hide()
 
     def unsave_dialog(self, widget, data =None):
         """don't save before closing"""
-        self.dialog.hide()
+        self.get_save_dialog().hide()
+        autosave.dismiss(self.buffers[self.current])
         self.close_buffer()
 
     def save_dialog(self, widget, data=None):
-        """save when closing"""
-        self.dialog.hide()
-        self.save_file()
-        self.close_buffer()
+        """save when closing, the buffer is closed once it is saved"""
+        self.get_save_dialog().hide()
+        self.save_file(self.close_saved)
+
+    def close_saved(self, buf):
+        """close buf after it was saved, unless edited since"""
+        if buf in self.buffers and not autosave.is_dirty(buf):
+            self.set_buffer(self.buffers.index(buf))
+            self.close_buffer()
 
     def close_buffer(self):
         """ Close current buffer """
@@ -395,7 +734,15 @@ continue editing your document.")
 
         if len(self.buffers) > 1:
 
-            self.buffers.pop(self.current)
+            buf = self.buffers.pop(self.current)
+            if buf.loader:
+                buf.loader.cancel()
+            if buf.pager:
+                buf.pager.close()
+            buf.statistics.disconnect()
+            buf.journal.discard()
+            autosave.forget_buffer(buf)
+            hibernate.discard(buf)
             self.current = min(len(self.buffers) - 1, self.current)
             self.set_buffer(self.current)
         else:
@@ -407,12 +754,33 @@ continue editing your document.")
         if index >= 0 and index < len(self.buffers):
             self.current = index
             buf = self.buffers[index]
+            if buf.hibernated:
+                hibernate.rehydrate(buf)
+            buf.last_used = time.time()
             self.textbox.set_buffer(buf)
+            self.textbox.set_editable(not (buf.pager or buf.loader))
+            if hasattr(self, 'search_bar'):
+                self.search_bar.buffer_switched()
             if hasattr(self, 'status'):
                 self.status.set_text(
                     _('Switching to buffer %(buffer_id)d (%(buffer_name)s)'
                     % {'buffer_id': self.current + 1,
                        'buffer_name': buf.filename}))
+                if buf.pending_load:
+                    self.start_loading(buf, self.status)
+            if self.prefetch_buffers and not self.prefetch_id:
+                self.prefetch_id = gobject.idle_add(self.prefetch,
+                    priority=gobject.PRIORITY_LOW)
+            if self.memory_budget and not self.budget_id:
+                self.budget_id = gobject.idle_add(self.enforce_memory_budget,
+                    priority=gobject.PRIORITY_LOW)
+
+    def enforce_memory_budget(self):
+        """ Hibernate inactive buffers while over the memory budget """
+        self.budget_id = 0
+        hibernate.enforce_budget(self.buffers, self.buffers[self.current],
+                                 self.memory_budget)
+        return False
 
     def next_buffer(self):
         """ Switch to next buffer """
@@ -442,39 +810,52 @@ continue editing your document.")
     def dialog_quit(self):
         """the quit dialog"""
         count = 0
-        ret = False
         for buf in self.buffers:
-            if (buf.can_undo() or buf.can_redo()) and \
-            not buf.get_text(buf.get_start_iter(),
-                                 buf.get_end_iter()) == '':
+            if autosave.is_dirty(buf) and buf.get_char_count():
                 count = count + 1
         if count > 0:
-            self.quitdialog.show()
+            self.get_quit_dialog().show()
         else:
             self.quit()
 
     def cancel_quit(self, widget, data=None):
         """don't quit"""
-        self.quitdialog.hide()
+        self.get_quit_dialog().hide()
 
     def save_quit(self, widget, data=None):
         """save before quitting"""
-        self.quitdialog.hide()
-        for buf in self.buffers:
-            if buf.can_undo() or buf.can_redo():
-                if buf.filename == FILE_UNNAMED:
-                    self.save_file_as()
-                else:
-                    self.save_file()
-        self.quit()
+        self.get_quit_dialog().hide()
+        self.save_all(self.quit)
 
     def quit_quit(self, widget, data=None):
         """really quit"""
-        self.quitdialog.hide()
+        self.get_quit_dialog().hide()
+        for buf in self.buffers:
+            autosave.dismiss(buf)
         self.quit()
 
     def quit(self):
-        """cleanup before quitting"""
+        """cleanup before quitting, once the saves still queued are done"""
+        saver.wait()
+        # their outcome is reported from idle callbacks already queued
+        gobject.idle_add(self.finish_quit, self.failed_saves)
+
+    def finish_quit(self, failed_saves):
+        """quit, unless a save failed meanwhile and the journals of the
+        files are still needed"""
+        if self.failed_saves > failed_saves:
+            self.status.set_text(_('Not quitting, a file could not be saved'))
+            return False
         autosave.autosave_quit()
+        for buf in self.buffers:
+            buf.journal.discard()
+            hibernate.discard(buf)
+        if self.watchdog:
+            self.watchdog.stop()
+            try:
+                self.watchdog.dump()
+            except (IOError, OSError):
+                pass
         self.gui.quit()
+        return False
 # EOF
@@ -31,52 +31,102 @@ Based on code posted on ubuntu forums by NoWhereMan (www.nowhereland.it)
 :license: GNU General Public License, version 3 or later
 """
 
+import startup_trace
 import gettext
 import locale
+startup_trace.begin('locale.setlocale')
 locale.setlocale(locale.LC_ALL, '')
+startup_trace.end('locale.setlocale')
 from optparse import OptionParser
 import sys
 import os
 
-import gtk
-
 locales_path = os.path.join(
     os.path.dirname(os.path.abspath(__file__)),
     'locales'
 )
+startup_trace.begin('gettext.install')
 gettext.install(locales_path)
+startup_trace.end('gettext.install')
 
 import PyRoom
-import autosave
-from basic_edit import BasicEdit
-from pyroom_error import handle_error
-from preferences import PyroomConfig
 
 __VERSION__ = PyRoom.__VERSION__
 
-pyroom_config = PyroomConfig()
+def stats(args):
+    """print the statistics show_info would give for files, without gtk"""
+    import project
+
+    parser = OptionParser(usage = _('%prog stats [-t] file1 [file2]...'),
+                        description = _('Count the characters, words and \
+lines of files the way PyRoom does, without a display.'))
+    parser.add_option('-t', '--total',
+                    action = 'store_true', dest = 'total',
+                    help = _('Also print the totals of all the files'))
+    (options, filenames) = parser.parse_args(args)
+    if not filenames:
+        parser.error(_('no file given'))
+
+    status = 0
+    totals = [0, 0, 0]
+    for filename, counts in zip(filenames, project.count_files(filenames)):
+        if counts is None:
+            sys.stderr.write(_('pyroom: unable to read %s\n') % filename)
+            status = 1
+            continue
+        counts = counts[2:]
+        print '%10d %10d %10d %s' % (counts + (filename,))
+        totals = [total + count for total, count in zip(totals, counts)]
+    if options.total:
+        print '%10d %10d %10d %s' % tuple(totals + [_('total')])
+    return status
 
 def main():
+    args = sys.argv[1:]
+    if args and args[0] == 'stats':
+        return stats(args[1:])
+
+    # Plain file lists go to a running pyroom if there is one, before
+    # paying for gtk and the configuration
+    import remote
+    if args and not [arg for arg in args if arg.startswith('-')]:
+        if remote.forward(args):
+            return 0
+
+    startup_trace.begin('imports')
+    import gobject
+    import gtk
+
+    import autosave
+    import journal
+    import snapshots
+    from basic_edit import BasicEdit
+    from pyroom_error import handle_error
+    from preferences import PyroomConfig
+    from project import Project
+    import watchdog
+    startup_trace.end('imports')
+
     sys.excepthook = handle_error
+    gobject.threads_init()
+    startup_trace.begin('PyroomConfig')
+    pyroom_config = PyroomConfig()
+    startup_trace.end('PyroomConfig')
 
     files = []
     style = pyroom_config.config.get('visual', 'theme')
-    autosave.autosave_time = pyroom_config.config.get('editor', 'autosavetime')
 
     # Preparing the themes list for the optionparser
-    themes_list = pyroom_config.read_themes_list()
-    themes_list.append('custom')
+    themes_list = pyroom_config.themeslist + ['custom']
 
     # Get commandline args
     parser = OptionParser(usage = _('%prog [-v] [--style={style name}] \
-[file1] [file2]...'),
+[--project={directory}] [file1] [file2]...'),
                         version = '%prog ' + __VERSION__,
                         description = _('PyRoom lets you edit text files \
 simply and efficiently in a full-screen window, with no distractions.'))
     parser.set_defaults(
                         style = pyroom_config.config.get('visual', 'theme'),
-                        autosave_time = pyroom_config.config.get('editor',
-                                                        'autosavetime')
                        )
     parser.add_option('-a', '--autosave',
                     type = 'int', action = 'store', dest = 'autosave_time',
@@ -86,24 +136,87 @@ simply and efficiently in a full-screen window, with no distractions.'))
                     action = 'store', dest = 'style',
                     type = 'choice', choices = themes_list,
                     help = _('Override the default style'))
+    parser.add_option('--trace-startup',
+                    action = 'store', dest = 'trace_startup', metavar = 'FILE',
+                    help = _('Write a JSON report of the startup phases to \
+FILE, - for standard error'))
+    parser.add_option('-n', '--new-instance',
+                    action = 'store_true', dest = 'new_instance',
+                    help = _('Open the files in a new window even if PyRoom \
+is already running'))
+    parser.add_option('-p', '--project',
+                    action = 'store', dest = 'project', metavar = 'DIR',
+                    help = _('Open the text files under DIR as a project, \
+Control-I shows the totals of the project'))
+    parser.add_option('--watchdog',
+                    action = 'store', dest = 'watchdog', metavar = 'MS',
+                    help = _('Measure how long the main loop takes to \
+respond, recording what it was doing when it took more than MS \
+miliseconds; Control-I shows the figures'))
     (options, args) = parser.parse_args()
 
     style = options.style
-    autosave.autosave_time = options.autosave_time
     files = args
+    project = None
+    if options.project:
+        if not os.path.isdir(options.project):
+            parser.error(_('%s is not a directory') % options.project)
+        startup_trace.begin('project scan')
+        project = Project(options.project)
+        project.scan()
+        startup_trace.end('project scan')
+        files = project.filenames() + files
 
     # Create relevant buffers for file and load them
+    startup_trace.begin('BasicEdit')
     pyroom = BasicEdit(style=style, pyroom_config=pyroom_config)
-    buffnum = 0
+    startup_trace.end('BasicEdit')
+    pyroom.project = project
+    threshold = watchdog.find_threshold(
+        pyroom_config.config.get('editor', 'watchdog'), options.watchdog)
+    if threshold:
+        pyroom.watchdog = watchdog.Watchdog(threshold)
+    # the preferences set the autosave time, the command line overrides it
+    if options.autosave_time is not None:
+        autosave.autosave_time = options.autosave_time
+    if startup_trace.enabled():
+        startup_trace.ExposeWatch(pyroom.window, pyroom.quit,
+            lambda: {'dialogs': pyroom.dialogs.report()})
+    startup_trace.begin('open files')
+    recovered, stale = journal.recover(pyroom)
+    journaled = [os.path.abspath(buf.filename) for buf in pyroom.buffers
+                 if buf.journal.filename]
+    buffnum = recovered
     if len(files):
         for filename in files:
-            pyroom.open_file_no_chooser(filename)
+            pyroom.open_file_no_chooser(filename, lazy=True)
             buffnum += 1
 
     pyroom.set_buffer(buffnum)
-    pyroom.status.set_text(
-        _('Welcome to Pyroom %s, type Control-H for help' % __VERSION__))
-    gtk.main()
+    startup_trace.end('open files')
+    if recovered:
+        pyroom.status.set_text(_('Recovered %d buffer(s) from the edit \
+journal') % recovered)
+    else:
+        pyroom.status.set_text(
+            _('Welcome to Pyroom %s, type Control-H for help' % __VERSION__))
+    if stale:
+        pyroom.status.set_text(_('%(status)s; %(count)d edit journal(s) no \
+longer match their file, kept in %(folder)s') % {
+            'status': pyroom.status.get_text(), 'count': len(stale),
+            'folder': journal.STALE_FOLDER})
+    startup_trace.begin('recovery index')
+    snapshot_entries = snapshots.recoverable(journaled)
+    startup_trace.end('recovery index')
+    if snapshot_entries:
+        gobject.idle_add(pyroom.offer_recovery, snapshot_entries)
+    server = remote.InstanceServer(pyroom)
+    if pyroom.watchdog:
+        pyroom.watchdog.start()
+    try:
+        gtk.main()
+    finally:
+        server.close()
 
 if __name__ == '__main__':
         main()
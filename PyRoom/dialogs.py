@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+build the dialogs of interface.glade on demand
+
+interface.glade is read once and split into one small glade document per
+toplevel widget; libglade then only has to parse the dialog being built,
+and only when it is first needed
+"""
+
+import gtk.glade
+import re
+import time
+
+TOPLEVEL_RE = re.compile(r'^<widget class="[^"]+" id="([^"]+)">.*?^</widget>$',
+                         re.MULTILINE | re.DOTALL)
+FOOTER = '\n</glade-interface>\n'
+
+
+class DialogFactory(object):
+    """shared access to the toplevel widgets of a glade file"""
+
+    def __init__(self, glade_file):
+        start = time.time()
+        source_file = open(glade_file, 'r')
+        source = source_file.read()
+        source_file.close()
+        body = source.index('<glade-interface>') + len('<glade-interface>')
+        header = source[:body] + '\n'
+        self.documents = {}
+        for match in TOPLEVEL_RE.finditer(source):
+            self.documents[match.group(1)] = header + match.group(0) + FOOTER
+        self.trees = {}
+        self.windows = {}
+        self.timings = {'read': time.time() - start}
+
+    def get_tree(self, name):
+        """the glade tree rooted at toplevel name, parsed on first use"""
+        if name not in self.trees:
+            start = time.time()
+            document = self.documents[name]
+            self.trees[name] = gtk.glade.xml_new_from_buffer(document,
+                len(document), name)
+            self.timings[name] = time.time() - start
+        return self.trees[name]
+
+    def get_dialog(self, name, handlers, parent):
+        """the toplevel widget name, built and connected on first use"""
+        if name not in self.windows:
+            tree = self.get_tree(name)
+            window = tree.get_widget(name)
+            window.set_transient_for(parent)
+            tree.signal_autoconnect(handlers)
+            self.windows[name] = window
+        return self.windows[name]
+
+    def report(self):
+        """seconds spent reading and building, and dialogs never built"""
+        return {
+            'timings': self.timings,
+            'deferred': sorted([name for name in self.documents
+                                if name not in self.trees]),
+        }
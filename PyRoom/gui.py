@@ -25,18 +25,45 @@ Additionally allows user to apply custom settings
 """
 
 import gtk
-import gobject
 import pango
 import gtksourceview
 import gtk.glade
 import ConfigParser
 import os
+import time
+
+import scheduler
+
+FRAME_INTERVAL = 40  # Miliseconds between two fade frames
+
+
+def build_gradient(active_color, inactive_color, duration):
+    """colors of the fade frames, from active to inactive
+
+    consecutive frames of the same color share a single color object"""
+    active = gtk.gdk.color_parse(active_color)
+    inactive = gtk.gdk.color_parse(inactive_color)
+    frames = max(1, int(duration / FRAME_INTERVAL))
+    gradient = []
+    previous = None
+    for frame in range(frames + 1):
+        level = 1.0 - float(frame) / frames
+        rgb = (inactive.red + int(level * (active.red - inactive.red)),
+               inactive.green + int(level * (active.green - inactive.green)),
+               inactive.blue + int(level * (active.blue - inactive.blue)))
+        if rgb != previous:
+            color = gtk.gdk.Color(*rgb)
+            previous = rgb
+        gradient.append(color)
+    return gradient
+
 
 class FadeLabel(gtk.Label):
     """ GTK Label with timed fade out effect """
 
     active_duration = 3000  # Fade start after this time
     fade_duration = 1500.0  # Fade duration
+    gradients = {}  # (active, inactive, duration): colors of the fade
 
     def __init__(self, message='', active_color=None, inactive_color=None):
         gtk.Label.__init__(self, message)
@@ -45,9 +72,30 @@ class FadeLabel(gtk.Label):
         self.active_color = active_color
         if not inactive_color:
             inactive_color = '#000000'
-        self.fade_level = 0
         self.inactive_color = inactive_color
-        self.idle = 0
+        self.fade_timer = scheduler.Timer(self.fade_start)
+        self.frame_timer = scheduler.Timer(self.fade_out)
+        self.fade_started = 0
+        self.shown_color = None
+
+    def set_colors(self, active_color, inactive_color):
+        """change the fade colors, dropping the gradients of the old ones"""
+        self.active_color = active_color
+        self.inactive_color = inactive_color
+        FadeLabel.gradients.clear()
+
+    def get_gradient(self):
+        """the cached gradient of the current colors"""
+        key = (self.active_color, self.inactive_color, self.fade_duration)
+        if key not in FadeLabel.gradients:
+            FadeLabel.gradients[key] = build_gradient(*key)
+        return FadeLabel.gradients[key]
+
+    def show_color(self, color):
+        """apply color, unless it is already shown"""
+        if color is not self.shown_color:
+            self.modify_fg(gtk.STATE_NORMAL, color)
+            self.shown_color = color
 
     def set_text(self, message, duration=None):
         """change text that is displayed
@@ -55,35 +103,26 @@ class FadeLabel(gtk.Label):
         @param duration: duration in miliseconds"""
         if not duration:
             duration = self.active_duration
-        self.modify_fg(gtk.STATE_NORMAL,
-                       gtk.gdk.color_parse(self.active_color))
+        self.show_color(self.get_gradient()[0])
         gtk.Label.set_text(self, message)
-        if self.idle:
-            gobject.source_remove(self.idle)
-        self.idle = gobject.timeout_add(duration, self.fade_start)
+        self.frame_timer.cancel()
+        self.fade_timer.restart(duration / 1000.0)
 
     def fade_start(self):
         """start fading timer"""
-        self.fade_level = 1.0
-        if self.idle:
-            gobject.source_remove(self.idle)
-        self.idle = gobject.timeout_add(25, self.fade_out)
+        self.fade_started = time.time()
+        self.fade_out()
 
     def fade_out(self):
-        """now fade out"""
-        color = gtk.gdk.color_parse(self.inactive_color)
-        (red1, green1, blue1) = (color.red, color.green, color.blue)
-        color = gtk.gdk.color_parse(self.active_color)
-        (red2, green2, blue2) = (color.red, color.green, color.blue)
-        red = red1 + int(self.fade_level * abs(red1 - red2))
-        green = green1 + int(self.fade_level * abs(green1 - green2))
-        blue = blue1 + int(self.fade_level * abs(blue1 - blue2))
-        self.modify_fg(gtk.STATE_NORMAL, gtk.gdk.Color(red, green, blue))
-        self.fade_level -= 1.0 / (self.fade_duration / 25)
-        if self.fade_level > 0:
-            return True
-        self.idle = 0
-        return False
+        """now fade out, picking the frame from the time elapsed so late
+        timer ticks skip frames instead of stretching the fade"""
+        gradient = self.get_gradient()
+        frame = int((time.time() - self.fade_started) * 1000 / FRAME_INTERVAL)
+        if frame < len(gradient) - 1:
+            self.show_color(gradient[frame])
+            self.frame_timer.arm(FRAME_INTERVAL / 1000.0)
+        else:
+            self.show_color(gradient[-1])
 
 class GUI(object):
     """our basic global gui object"""
@@ -133,6 +172,22 @@ class GUI(object):
         self.hbox.set_spacing(12)
         self.hbox.pack_end(self.status, True, True, 0)
         self.vbox.pack_end(self.hbox, False, False, 0)
+
+        # Goto line entry, shown on demand
+        self.goto_entry = gtk.Entry()
+        self.goto_entry.set_width_chars(12)
+        self.goto_entry.set_no_show_all(True)
+        self.hbox.pack_start(self.goto_entry, False, False, 0)
+
+        # Find and replace entries, shown on demand
+        self.find_entry = gtk.Entry()
+        self.find_entry.set_width_chars(24)
+        self.find_entry.set_no_show_all(True)
+        self.hbox.pack_start(self.find_entry, False, False, 0)
+        self.replace_entry = gtk.Entry()
+        self.replace_entry.set_width_chars(24)
+        self.replace_entry.set_no_show_all(True)
+        self.hbox.pack_start(self.replace_entry, False, False, 0)
         self.status.set_alignment(0.0, 0.5)
         self.status.set_justify(gtk.JUSTIFY_LEFT)
 
@@ -212,8 +267,8 @@ class GUI(object):
         self.textbox.modify_text(gtk.STATE_NORMAL, get_color('foreground'))
         self.textbox.modify_text(gtk.STATE_SELECTED, get_color('background'))
         self.textbox.modify_fg(gtk.STATE_NORMAL, get_color('foreground'))
-        self.status.active_color = self.config.get('theme', 'foreground')
-        self.status.inactive_color = self.config.get('theme', 'background')
+        self.status.set_colors(self.config.get('theme', 'foreground'),
+                               self.config.get('theme', 'background'))
         self.boxout.modify_bg(gtk.STATE_NORMAL, 
                               get_color('border'),
                              )
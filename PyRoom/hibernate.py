@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+hibernate inactive buffers
+
+when the open buffers hold more text than the configured memory budget, the
+least recently used unmodified ones are written out zlib-compressed and
+emptied; they are filled again when switched to. The cursor position, the
+modified flag and the bookmarks survive hibernation, the undo history does
+not, as gtksourceview has no way to serialize it.
+"""
+
+import os
+import tempfile
+import zlib
+
+import autosave
+import navigation
+
+COMPRESSION_LEVEL = 6
+
+
+def resident_size(buf):
+    """rough memory use of a buffer and its statistics, in bytes"""
+    return buf.get_char_count() + buf.statistics.memory_size()
+
+
+def can_hibernate(buf):
+    """whether buf may be evicted"""
+    return buf.get_char_count() and not (buf.hibernated or buf.loader
+        or buf.pager or buf.pending_load or buf.get_modified()
+        or buf.saves_pending)
+
+
+def hibernate(buf):
+    """write buf out compressed and empty it"""
+    text = buf.get_text(buf.get_start_iter(), buf.get_end_iter())
+    if not os.path.isdir(autosave.TEMP_FOLDER):
+        os.mkdir(autosave.TEMP_FOLDER)
+    handle, filename = tempfile.mkstemp(prefix='pyroom_hibernate_',
+        dir=autosave.TEMP_FOLDER)
+    out_file = os.fdopen(handle, 'wb')
+    try:
+        out_file.write(zlib.compress(text, COMPRESSION_LEVEL))
+    finally:
+        out_file.close()
+    cursor = buf.get_iter_at_mark(buf.get_insert()).get_offset()
+    journal_paused = buf.journal.paused
+    bookmarks = navigation.bookmark_lines(buf)
+    buf.journal.paused = True
+    # the statistics, word index and generations keep describing the
+    # hibernated text
+    buf.statistics.freeze()
+    autosave.freeze(buf)
+    buf.begin_not_undoable_action()
+    buf.set_text('')
+    buf.end_not_undoable_action()
+    buf.set_modified(False)
+    buf.hibernated = (filename, cursor, journal_paused, bookmarks)
+
+
+def rehydrate(buf):
+    """fill a hibernated buffer again"""
+    filename, cursor, journal_paused, bookmarks = buf.hibernated
+    in_file = open(filename, 'rb')
+    try:
+        text = zlib.decompress(in_file.read())
+    finally:
+        in_file.close()
+    buf.begin_not_undoable_action()
+    buf.set_text(text)
+    buf.end_not_undoable_action()
+    buf.statistics.thaw()
+    autosave.thaw(buf)
+    buf.place_cursor(buf.get_iter_at_offset(cursor))
+    for mark in buf.bookmarks:
+        buf.delete_mark(mark)
+    buf.bookmarks = []
+    for line in bookmarks:
+        navigation.toggle_bookmark(buf, line)
+    buf.set_modified(False)
+    buf.journal.paused = journal_paused
+    discard(buf)
+
+
+def discard(buf):
+    """forget the hibernated copy of buf"""
+    if buf.hibernated:
+        os.unlink(buf.hibernated[0])
+        buf.hibernated = None
+
+
+def enforce_budget(buffers, current, budget):
+    """hibernate least recently used buffers until under budget"""
+    total = 0
+    for buf in buffers:
+        total += resident_size(buf)
+    if total <= budget:
+        return
+    candidates = [buf for buf in buffers
+                  if buf is not current and can_hibernate(buf)]
+    candidates.sort(key=lambda buf: buf.last_used)
+    for buf in candidates:
+        if total <= budget:
+            break
+        # the statistics stay, they describe the hibernated text
+        total -= buf.get_char_count()
+        hibernate(buf)
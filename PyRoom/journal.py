@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+append-only edit journal for crash recovery
+
+every insertion and deletion made to a buffer is appended, in small batches,
+to a journal file in $XDG_DATA_HOME/pyroom/journal. A journal applies to a
+base file, either the file the buffer was loaded from or saved to, or its
+latest autosave snapshot in the snapshot store. When a journal grows too large the buffer is
+autosaved and the journal starts over from that snapshot, carrying over the
+edits made while the snapshot was being written.
+
+Journals are removed when their buffer is closed or pyroom quits; the ones
+left behind by a crash are replayed on the next start. Those whose base
+changed or disappeared since cannot be replayed, they are moved to
+$XDG_DATA_HOME/pyroom/journal-stale instead.
+"""
+
+import fcntl
+import os
+import tempfile
+from xdg.BaseDirectory import xdg_data_home
+
+import autosave
+import scheduler
+import snapshots
+
+JOURNAL_FOLDER = os.path.join(xdg_data_home, 'pyroom', 'journal')
+STALE_FOLDER = os.path.join(xdg_data_home, 'pyroom', 'journal-stale')
+HEADER = 'PYROOM-JOURNAL 1\n'
+
+FLUSH_OPS = 64  # Write pending records once there are this many
+FLUSH_DELAY = 500  # or this many miliseconds after the first one
+COMPACT_SIZE = 1024 * 1024  # Snapshot the buffer past this journal size
+
+FILE_UNNAMED = _('* Unnamed *')
+
+
+def file_stamp(filename):
+    """size and mtime of a journal base, '' for the empty base"""
+    if not filename:
+        return ''
+    stat = os.stat(filename)
+    return '%d %r' % (stat.st_size, stat.st_mtime)
+
+
+class Journal(object):
+    """append-only log of the edits made to one buffer"""
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.base = ''
+        self.base_stamp = ''
+        self.paused = False
+        self.filename = None
+        self.journal_file = None
+        self.pending = []
+        self.carried = None
+        self.size = 0
+        self.flush_timer = scheduler.Timer(self.flush)
+        self.handlers = [
+            buf.connect('insert-text', self.record_insert),
+            buf.connect('delete-range', self.record_delete),
+        ]
+
+    def record_insert(self, buf, text_iter, text, length):
+        """journal an insertion"""
+        if not self.paused:
+            self.append('i %d %d\n%s\n' % (text_iter.get_offset(), len(text),
+                                           text))
+
+    def record_delete(self, buf, start, end):
+        """journal a deletion"""
+        if not self.paused:
+            self.append('d %d %d\n' % (start.get_offset(), end.get_offset()))
+
+    def append(self, record):
+        """queue a record, flushing full batches right away"""
+        self.pending.append(record)
+        if self.carried is not None:
+            self.carried.append(record)
+        if len(self.pending) >= FLUSH_OPS:
+            self.flush()
+        else:
+            self.flush_timer.arm(FLUSH_DELAY / 1000.0)
+
+    def flush(self):
+        """write the pending records"""
+        self.flush_timer.cancel()
+        if self.pending:
+            if self.journal_file is None:
+                self.create()
+            data = ''.join(self.pending)
+            self.pending = []
+            self.journal_file.write(data)
+            self.journal_file.flush()
+            self.size += len(data)
+            if self.size > COMPACT_SIZE and self.carried is None:
+                autosave.write_snapshot(self.buf)
+
+    def create(self):
+        """create and lock the journal file"""
+        if not os.path.isdir(JOURNAL_FOLDER):
+            os.makedirs(JOURNAL_FOLDER)
+        handle, self.filename = tempfile.mkstemp(prefix='journal_',
+            dir=JOURNAL_FOLDER)
+        self.journal_file = os.fdopen(handle, 'wb')
+        fcntl.flock(self.journal_file.fileno(), fcntl.LOCK_EX)
+        header = '%s%s\n%s\n%s\n' % (HEADER, self.buf.filename, self.base,
+                                     self.base_stamp)
+        self.journal_file.write(header)
+        self.size = len(header)
+
+    def close(self):
+        """forget the journal file"""
+        self.flush_timer.cancel()
+        self.pending = []
+        self.carried = None
+        if self.journal_file is not None:
+            self.journal_file.close()
+            os.unlink(self.filename)
+            self.journal_file = None
+            self.filename = None
+
+    def pause(self):
+        """stop journaling until the next rebase"""
+        self.close()
+        self.paused = True
+
+    def mark(self):
+        """a snapshot of the buffer is being written, keep the records that
+        come after it"""
+        self.carried = []
+
+    def rebase(self, base, carry=False):
+        """the buffer content is now that of the base file
+
+        with carry, the base holds the content as of the last mark and the
+        records made since are carried over to the new journal"""
+        records = carry and self.carried or []
+        self.close()
+        self.base = base
+        self.base_stamp = file_stamp(base)
+        self.paused = False
+        for record in records:
+            self.append(record)
+
+    def adopt(self, filename, journal_file, base, base_stamp):
+        """carry on appending to a recovered journal"""
+        self.filename = filename
+        self.journal_file = journal_file
+        self.base = base
+        self.base_stamp = base_stamp
+        self.size = journal_file.tell()
+        self.paused = False
+
+    def discard(self):
+        """the buffer is going away"""
+        self.close()
+        for handler in self.handlers:
+            self.buf.disconnect(handler)
+        self.handlers = []
+
+
+def replay(journal_file, buf):
+    """apply journal records to buf, returns the end of the last good one"""
+    good = journal_file.tell()
+    while True:
+        line = journal_file.readline()
+        if not line.endswith('\n'):
+            break
+        fields = line.split()
+        if len(fields) != 3 or fields[0] not in ('i', 'd'):
+            break
+        first, second = int(fields[1]), int(fields[2])
+        if fields[0] == 'i':
+            text = journal_file.read(second + 1)
+            if len(text) != second + 1:
+                break
+            buf.insert(buf.get_iter_at_offset(first), text[:-1])
+        else:
+            buf.delete(buf.get_iter_at_offset(first),
+                       buf.get_iter_at_offset(second))
+        good = journal_file.tell()
+    return good
+
+
+def bases():
+    """the files journals are based on"""
+    if not os.path.isdir(JOURNAL_FOLDER):
+        return []
+    found = []
+    for name in os.listdir(JOURNAL_FOLDER):
+        try:
+            journal_file = open(os.path.join(JOURNAL_FOLDER, name), 'rb')
+        except IOError:
+            continue
+        try:
+            if journal_file.readline() == HEADER:
+                journal_file.readline()
+                found.append(journal_file.readline()[:-1])
+        finally:
+            journal_file.close()
+    return found
+
+
+def set_aside(filename):
+    """move a journal that cannot be replayed out of the way, returns
+    where it went"""
+    if not os.path.isdir(STALE_FOLDER):
+        os.makedirs(STALE_FOLDER)
+    stale = os.path.join(STALE_FOLDER, os.path.basename(filename))
+    os.rename(filename, stale)
+    return stale
+
+
+def recover(edit_instance):
+    """reopen the buffers of journals left behind, returns their number and
+    the journals set aside"""
+    if not os.path.isdir(JOURNAL_FOLDER):
+        return 0, []
+    recovered = 0
+    stale = []
+    for name in sorted(os.listdir(JOURNAL_FOLDER)):
+        filename = os.path.join(JOURNAL_FOLDER, name)
+        journal_file = open(filename, 'r+b')
+        try:
+            fcntl.flock(journal_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            # still in use by another pyroom
+            journal_file.close()
+            continue
+        if journal_file.readline() != HEADER:
+            journal_file.close()
+            continue
+        source = journal_file.readline()[:-1]
+        base = journal_file.readline()[:-1]
+        base_stamp = journal_file.readline()[:-1]
+        text = ''
+        try:
+            valid = file_stamp(base) == base_stamp
+            if valid and snapshots.is_snapshot(base):
+                text = snapshots.load(base)
+            elif valid and base:
+                base_file = open(base, 'rb')
+                text = base_file.read()
+                base_file.close()
+        except (IOError, OSError):
+            valid = False
+        if not valid:
+            try:
+                stale.append(set_aside(filename))
+            except OSError:
+                pass
+            journal_file.close()
+            continue
+        buf = edit_instance.new_buffer()
+        buf.journal.pause()
+        buf.begin_not_undoable_action()
+        buf.set_text(unicode(text, 'utf-8'))
+        good = replay(journal_file, buf)
+        buf.end_not_undoable_action()
+        journal_file.seek(good)
+        journal_file.truncate()
+        buf.filename = source or FILE_UNNAMED
+        buf.set_modified(True)
+        buf.journal.adopt(filename, journal_file, base, base_stamp)
+        recovered += 1
+    return recovered, stale
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+load files into buffers without blocking the interface
+
+files are read in fixed-size chunks, decoded incrementally and appended to
+the buffer from idle callbacks, so the main loop keeps handling input while a
+large file is coming in
+
+a load that is cancelled or fails leaves what was read in an unnamed buffer,
+so saving it cannot truncate the file
+"""
+
+import codecs
+import gobject
+import os
+
+from pyroom_error import PyroomError
+
+# Bytes read and inserted per idle callback
+CHUNK_SIZE = 64 * 1024
+
+FILE_UNNAMED = _('* Unnamed *')
+
+
+class ChunkedLoader(object):
+    """streams one file into one buffer"""
+
+    def __init__(self, buf, filename, status=None, on_done=None):
+        """on_done(buf, complete) is called once loading stops"""
+        self.buf = buf
+        self.filename = filename
+        self.status = status
+        self.on_done = on_done
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.source = open(filename, 'rb')
+        self.size = os.fstat(self.source.fileno()).st_size
+        self.loaded = 0
+        self.idle = 0
+        self.last_percent = -1
+
+    def start(self):
+        """empty the buffer and schedule the first chunk"""
+        self.buf.loader = self
+        # counted once loaded, measuring the line each chunk goes on would
+        # be quadratic on long lines
+        self.buf.statistics.freeze()
+        self.buf.begin_not_undoable_action()
+        self.buf.set_text('')
+        self.idle = gobject.idle_add(self.load_chunk)
+
+    def load_chunk(self):
+        """read, decode and append a single chunk"""
+        data = self.source.read(CHUNK_SIZE)
+        final = not data
+        try:
+            text = self.decoder.decode(data, final)
+        except UnicodeDecodeError:
+            self.finish(False)
+            raise PyroomError(_('Unable to open %s, it is not a valid UTF-8 \
+file.') % self.filename)
+        if text:
+            self.buf.insert(self.buf.get_end_iter(), text)
+        if final:
+            if self.status:
+                self.status.set_text(_('File %s open') % self.filename)
+            self.finish()
+            return False
+        self.loaded += len(data)
+        self.show_progress()
+        return True
+
+    def show_progress(self):
+        """display the loaded percentage on the status label"""
+        if not self.status or not self.size:
+            return
+        percent = self.loaded * 100 / self.size
+        if percent != self.last_percent:
+            self.last_percent = percent
+            self.status.set_text(_('Loading %(filename)s: %(percent)d%%') % {
+                'filename': self.filename, 'percent': percent})
+
+    def cancel(self):
+        """stop loading, keeping what has been read so far unnamed"""
+        if self.idle:
+            gobject.source_remove(self.idle)
+        if self.status:
+            self.status.set_text(_('Loading of %s cancelled, the part read \
+is in an unnamed buffer') % self.filename)
+        self.finish(False)
+
+    def finish(self, complete=True):
+        """release the file and hand the buffer back to the user"""
+        self.idle = 0
+        self.source.close()
+        self.buf.end_not_undoable_action()
+        self.buf.statistics.thaw()
+        self.buf.statistics.recount()
+        self.buf.place_cursor(self.buf.get_start_iter())
+        if not complete:
+            # only part of the file, which must not be saved over it
+            self.buf.filename = FILE_UNNAMED
+        self.buf.set_modified(False)
+        self.buf.loader = None
+        if self.on_done:
+            self.on_done(self.buf, complete)
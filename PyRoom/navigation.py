@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+goto line, percentage or paragraph, and bookmarks
+
+lines are looked up in the text buffer's own btree and paragraphs in the
+per-line word counts the buffer statistics keep up to date, so a jump costs
+the same anywhere in the document. Bookmarks are text marks, which follow
+the edits; they are stored per file in $XDG_DATA_HOME/pyroom/bookmarks as
+line numbers, whenever the buffer matches the file on disk.
+"""
+
+import hashlib
+import os
+import re
+from xdg.BaseDirectory import xdg_data_home
+
+BOOKMARK_FOLDER = os.path.join(xdg_data_home, 'pyroom', 'bookmarks')
+
+# 120 is a line, 40% a position in the text, p12 a paragraph
+POSITION_RE = re.compile(ur'^\s*(?:(\d+)|(\d+(?:\.\d*)?)\s*%|[p¶]\s*(\d+))\s*$',
+                         re.IGNORECASE | re.UNICODE)
+
+FILE_UNNAMED = _('* Unnamed *')
+
+
+def parse_position(text):
+    """('line', n), ('percent', p) or ('paragraph', n), None if invalid"""
+    match = POSITION_RE.match(text)
+    if not match:
+        return None
+    line, percent, paragraph = match.groups()
+    if line:
+        return ('line', int(line))
+    if percent:
+        return ('percent', min(float(percent), 100.0))
+    return ('paragraph', int(paragraph))
+
+
+def position_iter(buf, kind, value):
+    """iter at the start of a line, position or paragraph; lines and
+    paragraphs count from 1"""
+    if kind == 'line':
+        line = max(0, min(value, buf.get_line_count()) - 1)
+    elif kind == 'percent':
+        text_iter = buf.get_iter_at_offset(
+            int(buf.get_char_count() * value / 100))
+        line = text_iter.get_line()
+    else:
+        paragraphs = buf.statistics.paragraph_lines()
+        if not paragraphs:
+            return buf.get_start_iter()
+        line = paragraphs[max(0, min(value, len(paragraphs)) - 1)]
+    return buf.get_iter_at_line(line)
+
+
+def bookmark_file(filename):
+    """where the bookmarks of filename are kept"""
+    digest = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+    return os.path.join(BOOKMARK_FOLDER, digest)
+
+
+def bookmark_lines(buf):
+    """sorted lines holding a bookmark"""
+    lines = set()
+    for mark in buf.bookmarks:
+        lines.add(buf.get_iter_at_mark(mark).get_line())
+    return sorted(lines)
+
+
+def toggle_bookmark(buf, line):
+    """add a bookmark on line, or remove the ones already there"""
+    marks = [mark for mark in buf.bookmarks
+             if buf.get_iter_at_mark(mark).get_line() == line]
+    for mark in marks:
+        buf.bookmarks.remove(mark)
+        buf.delete_mark(mark)
+    if not marks:
+        buf.bookmarks.append(buf.create_mark(None,
+            buf.get_iter_at_line(line), True))
+    return not marks
+
+
+def next_bookmark(buf, line):
+    """first bookmarked line after line, wrapping around, or None"""
+    lines = bookmark_lines(buf)
+    for bookmarked in lines:
+        if bookmarked > line:
+            return bookmarked
+    if lines:
+        return lines[0]
+    return None
+
+
+def load_bookmarks(buf):
+    """restore the bookmarks saved for the file of buf"""
+    for mark in buf.bookmarks:
+        buf.delete_mark(mark)
+    buf.bookmarks = []
+    try:
+        in_file = open(bookmark_file(buf.filename))
+    except IOError:
+        return
+    try:
+        for line in in_file:
+            try:
+                line = int(line)
+            except ValueError:
+                continue
+            if line < buf.get_line_count():
+                toggle_bookmark(buf, line)
+    finally:
+        in_file.close()
+
+
+def save_bookmarks(buf, filename):
+    """store the bookmarks of buf for filename"""
+    if filename == FILE_UNNAMED:
+        return
+    path = bookmark_file(filename)
+    lines = bookmark_lines(buf)
+    if not lines:
+        if os.path.exists(path):
+            os.unlink(path)
+        return
+    if not os.path.isdir(BOOKMARK_FOLDER):
+        os.makedirs(BOOKMARK_FOLDER)
+    out_file = open(path, 'w')
+    try:
+        out_file.write(''.join(['%d\n' % line for line in lines]))
+    finally:
+        out_file.close()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+read-only paging of very large files
+
+the file is memory-mapped and only a window of lines around the viewport is
+put in the buffer; the window moves when the view is scrolled close to one
+of its ends. A background thread counts the newlines of every block of the
+file, which is all it takes to find where a line starts, so neither opening
+the file nor memory use depend on its size.
+"""
+
+import array
+import bisect
+import mmap
+import os
+import threading
+
+BLOCK_SIZE = 64 * 1024
+WINDOW_LINES = 2000  # Lines held in the buffer
+WINDOW_BYTES = 4 * 1024 * 1024  # but no more than this many bytes
+
+
+class LineIndex(threading.Thread):
+    """newline counts of the blocks of a mapped file"""
+
+    def __init__(self, data):
+        threading.Thread.__init__(self, name='pyroom-pager')
+        self.setDaemon(True)
+        self.data = data
+        # newlines before each counted block, then the total so far
+        self.counts = array.array('l', [0])
+        self.done = False
+        self.stopped = False
+
+    def run(self):
+        size = len(self.data)
+        start = 0
+        total = 0
+        while start < size and not self.stopped:
+            total += self.data[start:start + BLOCK_SIZE].count('\n')
+            start += BLOCK_SIZE
+            self.counts.append(total)
+        self.done = not self.stopped
+
+    def stop(self):
+        """stop counting"""
+        self.stopped = True
+
+    def known_lines(self):
+        """lines whose start is known so far"""
+        return self.counts[-1] + 1
+
+    def line_offset(self, line):
+        """byte offset line starts at, None if not indexed yet"""
+        if line == 0:
+            return 0
+        counts = self.counts
+        last = len(counts) - 1
+        if line > counts[last]:
+            return None
+        # the block holding the newline that ends the previous line
+        block = bisect.bisect_left(counts, line, 0, last) - 1
+        offset = block * BLOCK_SIZE
+        for skip in xrange(line - counts[block]):
+            offset = self.data.find('\n', offset) + 1
+        return offset
+
+
+class Pager(object):
+    """shows a window of a large file in a read-only buffer"""
+
+    def __init__(self, buf, filename, status=None):
+        self.buf = buf
+        self.filename = filename
+        self.status = status
+        self.source = open(filename, 'rb')
+        self.size = os.fstat(self.source.fileno()).st_size
+        self.data = mmap.mmap(self.source.fileno(), self.size,
+                              access=mmap.ACCESS_READ)
+        self.index = LineIndex(self.data)
+        self.first = 0
+        self.count = 0
+        self.moving = False
+
+    def start(self):
+        """show the top of the file and start indexing it"""
+        self.buf.pager = self
+        self.index.start()
+        self.show(0)
+        if self.status:
+            self.status.set_text(_('File %s open read-only, it is too large \
+to edit') % self.filename)
+
+    def show(self, first):
+        """put the lines from first on in the buffer"""
+        start = self.index.line_offset(first)
+        if start is None:
+            return False
+        last = min(first + WINDOW_LINES, self.index.known_lines() - 1)
+        end = self.index.line_offset(last)
+        if last <= first or end is None:
+            end = self.size
+        data = self.data[start:min(end, start + WINDOW_BYTES)]
+        if end - start > WINDOW_BYTES:
+            # only the lines starting in the window, the last one cut short;
+            # a line longer than the window is never shown past it
+            last = first + max(1, data.count('\n'))
+        text = unicode(data, 'utf-8', 'replace')
+        self.first = first
+        self.count = last - first
+        self.buf.begin_not_undoable_action()
+        self.buf.set_text(text)
+        self.buf.end_not_undoable_action()
+        self.buf.set_modified(False)
+        return True
+
+    def total_lines(self):
+        """lines in the file, a lower bound while it is being indexed"""
+        return self.index.known_lines()
+
+    def scrolled(self, textview, adjustment):
+        """move the window when the view gets close to one of its ends"""
+        if self.moving:
+            return
+        near_top = adjustment.value < adjustment.page_size and self.first
+        near_bottom = (adjustment.value + 2 * adjustment.page_size
+                       > adjustment.upper
+                       and self.first + self.count
+                           < self.index.known_lines() - 1)
+        if not (near_top or near_bottom):
+            return
+        top = textview.get_line_at_y(int(adjustment.value))[0].get_line()
+        top += self.first
+        self.moving = True
+        try:
+            if self.show(max(0, top - WINDOW_LINES / 2)):
+                line_iter = self.buf.get_iter_at_line(top - self.first)
+                self.buf.place_cursor(line_iter)
+                textview.scroll_to_mark(self.buf.get_insert(), 0.0, True,
+                                        0.0, 0.0)
+        finally:
+            self.moving = False
+
+    def close(self):
+        """unmap the file"""
+        self.index.stop()
+        self.index.join()
+        self.data.close()
+        self.source.close()
+        self.buf.pager = None
@@ -27,7 +27,6 @@ via the dialog
 """
 
 import gtk
-import gtk.glade
 import os
 from ConfigParser import SafeConfigParser, NoOptionError
 import shutil
@@ -35,6 +34,7 @@ from xdg.BaseDirectory import xdg_config_home, xdg_data_home
 
 from pyroom_error import PyroomError
 import autosave
+import startup_trace
 
 DEFAULT_CONF = {
     'visual':{
@@ -44,8 +44,16 @@ DEFAULT_CONF = {
     },
     'editor':{
         'session':'True',
-        'autosavetime':'2',
-        'autosave':'0',
+        'autosavetime':str(autosave.AUTOSAVE_TIME),
+        'autosave':'1',
+        'fsync':'1',
+        'prefetch':'1',
+        'memorybudget':'256',
+        'historycount':'10',
+        'historydays':'7',
+        'historysize':'64',
+        'pagerthreshold':'256',
+        'watchdog':'0',
     },
 }
 
@@ -100,7 +108,9 @@ class PyroomConfig(object):
         self.config = FailsafeConfigParser()
         self.build_default_conf()
         self.config.readfp(open(self.conf_file, 'r'))
+        startup_trace.begin('read_themes_list')
         self.themeslist = self.read_themes_list()
+        startup_trace.end('read_themes_list')
 
     def build_default_conf(self):
         """builds necessary default conf.
@@ -139,29 +149,12 @@ class PyroomConfig(object):
 
 class Preferences(object):
     """our main preferences object, to be passed around where needed"""
-    def __init__(self, gui, style, pyroom_config):
+    def __init__(self, gui, style, pyroom_config, dialogs):
         self.style = style
         self.pyroom_config = pyroom_config
-        self.wTree = gtk.glade.XML(os.path.join(
-            pyroom_config.pyroom_absolute_path, "interface.glade"),
-            "dialog-preferences")
-
-        # Defining widgets needed
-        self.window = self.wTree.get_widget("dialog-preferences")
-        self.fontpreference = self.wTree.get_widget("fontbutton")
-        self.colorpreference = self.wTree.get_widget("colorbutton")
-        self.bgpreference = self.wTree.get_widget("bgbutton")
-        self.borderpreference = self.wTree.get_widget("borderbutton")
-        self.paddingpreference = self.wTree.get_widget("paddingtext")
-        self.heightpreference = self.wTree.get_widget("heighttext")
-        self.heightpreference.set_range(0.05, 0.95)
-        self.widthpreference = self.wTree.get_widget("widthtext")
-        self.widthpreference.set_range(0.05, 0.95)
-        self.presetscombobox = self.wTree.get_widget("presetscombobox")
-        self.linenumbers = self.wTree.get_widget("linescheck")
-        self.autosave = self.wTree.get_widget("autosavetext")
-        self.autosave_spinbutton = self.wTree.get_widget("autosavetime")
-        self.linespacing_spinbutton = self.wTree.get_widget("linespacing")
+        self.dialogs = dialogs
+        self.wTree = None
+        self.dlg = None
 
         self.graphical = gui
 
@@ -180,12 +173,38 @@ class Preferences(object):
         self.autosavestate = self.config.get("editor", "autosave")
         self.autosavetime = self.config.get("editor", "autosavetime")
         self.linespacing = self.config.get("visual", "linespacing")
-        if self.autosavestate == 1:
-            autosave.autosave_time = self.autosavetime
-        else:
-            autosave.autosave_time = 0
         self.linesstate = int(self.linesstate)
         self.autosavestate = int(self.autosavestate)
+        if self.autosavestate:
+            autosave.autosave_time = int(float(self.autosavetime))
+        else:
+            autosave.autosave_time = 0
+
+        # The dialog itself is only built when first shown
+        startup_trace.begin('apply_style')
+        self.graphical.apply_style(self.style, 'normal')
+        startup_trace.end('apply_style')
+
+    def build(self):
+        """build the preferences dialog from the glade file"""
+        self.wTree = self.dialogs.get_tree("dialog-preferences")
+
+        # Defining widgets needed
+        self.window = self.wTree.get_widget("dialog-preferences")
+        self.fontpreference = self.wTree.get_widget("fontbutton")
+        self.colorpreference = self.wTree.get_widget("colorbutton")
+        self.bgpreference = self.wTree.get_widget("bgbutton")
+        self.borderpreference = self.wTree.get_widget("borderbutton")
+        self.paddingpreference = self.wTree.get_widget("paddingtext")
+        self.heightpreference = self.wTree.get_widget("heighttext")
+        self.heightpreference.set_range(0.05, 0.95)
+        self.widthpreference = self.wTree.get_widget("widthtext")
+        self.widthpreference.set_range(0.05, 0.95)
+        self.presetscombobox = self.wTree.get_widget("presetscombobox")
+        self.linenumbers = self.wTree.get_widget("linescheck")
+        self.autosave = self.wTree.get_widget("autosavetext")
+        self.autosave_spinbutton = self.wTree.get_widget("autosavetime")
+        self.linespacing_spinbutton = self.wTree.get_widget("linespacing")
 
         # Set up pyroom from conf file
         self.linespacing_spinbutton.set_value(int(self.linespacing))
@@ -295,7 +314,6 @@ class Preferences(object):
     def presetchanged(self, widget, mode=None):
         """some presets have changed, apply those"""
         if mode == 'initial':
-            self.graphical.apply_style(self.style, 'normal')
             self.fontname = "%s %s" % (self.graphical.config.get("theme", "font"),
                             self.graphical.config.get("theme", "fontsize"))
             self.fontpreference.set_font_name(self.fontname)
@@ -367,6 +385,8 @@ class Preferences(object):
 
     def show(self):
         """display the preferences dialog"""
+        if self.wTree is None:
+            self.build()
         self.dlg = self.wTree.get_widget("dialog-preferences")
         self.dlg.show()
 
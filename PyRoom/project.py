@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+projects: a directory tree of text files and their statistics
+
+the characters, words and lines of every file are counted the way the editor
+counts them for show_info, and cached in $XDG_DATA_HOME/pyroom/projects
+along with the size and mtime of the file. A scan only stats the tree and
+recounts the files whose size or mtime changed, in a process pool when there
+are many of them.
+
+this module does not import gtk, it is shared with the stats command
+"""
+
+import codecs
+import hashlib
+import multiprocessing
+import os
+from xdg.BaseDirectory import xdg_data_home
+
+import snapshots
+from statistics import count_words
+
+CACHE_FOLDER = os.path.join(xdg_data_home, 'pyroom', 'projects')
+HEADER = 'PYROOM-PROJECT 1\n'
+
+# Files of a project, the rest of the tree is left alone
+EXTENSIONS = ('.txt', '.text', '.md', '.markdown', '.mkd', '.rst', '.tex')
+BLOCK_SIZE = 64 * 1024
+POOL_THRESHOLD = 16  # Recount in a process pool past this many files
+# Characters that may be inside a word, besides letters and digits
+WORD_JOINERS = u"'\u2019"
+
+
+def count_file(filename):
+    """(characters, words, lines) of a utf-8 file, read a block at a time
+
+    lines are counted as the editor does, one more than the line ends, which
+    are \\n, \\r, \\r\\n and U+2029 like in gtk"""
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    chars = words = newlines = 0
+    partial = u''
+    carriage_return = False  # The last block ended with \r
+    in_file = open(filename, 'rb')
+    try:
+        while True:
+            data = in_file.read(BLOCK_SIZE)
+            text = decoder.decode(data, not data)
+            chars += len(text)
+            newlines += (text.count(u'\n') + text.count(u'\r')
+                         + text.count(u'\u2029') - text.count(u'\r\n'))
+            if carriage_return and text.startswith(u'\n'):
+                newlines -= 1
+            if text:
+                carriage_return = text.endswith(u'\r')
+            text = partial + text
+            # a word may go on in the next block, keep it for then
+            end = len(text)
+            if data:
+                while end and (text[end - 1].isalnum()
+                               or text[end - 1] in WORD_JOINERS):
+                    end -= 1
+            words += count_words(text[:end])
+            partial = text[end:]
+            if not data:
+                break
+    finally:
+        in_file.close()
+    return chars, words, newlines + 1
+
+
+def count_file_stat(filename):
+    """stamp and counts of a file, None when it cannot be read"""
+    try:
+        stat = os.stat(filename)
+        return (stat.st_size, stat.st_mtime) + count_file(filename)
+    except (IOError, OSError):
+        return None
+
+
+def count_files(filenames, function=count_file_stat):
+    """map function over filenames, in a process pool for long lists"""
+    if len(filenames) < POOL_THRESHOLD:
+        return map(function, filenames)
+    pool = multiprocessing.Pool()
+    try:
+        return pool.map(function, filenames, max(1,
+            len(filenames) / (4 * multiprocessing.cpu_count())))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def is_project_file(name):
+    """whether a file name is one of the text files of a project"""
+    return (not name.startswith('.') and
+            os.path.splitext(name)[1].lower() in EXTENSIONS)
+
+
+class Project(object):
+    """the text files under a directory and their cached statistics"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.cache_file = os.path.join(CACHE_FOLDER,
+                                       hashlib.sha1(self.root).hexdigest())
+        # relative path: (size, mtime, characters, words, lines)
+        self.files = {}
+        self.load_cache()
+
+    def load_cache(self):
+        """read the statistics cached by an earlier scan"""
+        try:
+            cache_file = open(self.cache_file, 'rb')
+        except IOError:
+            return
+        try:
+            if cache_file.readline() != HEADER:
+                return
+            for line in cache_file:
+                fields = line[:-1].split('\t', 5)
+                if len(fields) != 6 or not line.endswith('\n'):
+                    continue
+                try:
+                    self.files[fields[5]] = (int(fields[0]), float(fields[1]),
+                        int(fields[2]), int(fields[3]), int(fields[4]))
+                except ValueError:
+                    continue
+        finally:
+            cache_file.close()
+
+    def save_cache(self):
+        """write the statistics for the next scan"""
+        snapshots.write_file(self.cache_file, HEADER + ''.join([
+            '%d\t%r\t%d\t%d\t%d\t%s\n' % (entry + (path,))
+            for path, entry in sorted(self.files.items())]))
+
+    def walk(self):
+        """relative paths of the text files of the tree, sorted"""
+        paths = []
+        for directory, dirs, names in os.walk(self.root):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            relative = os.path.relpath(directory, self.root)
+            for name in names:
+                if is_project_file(name):
+                    if relative != '.':
+                        name = os.path.join(relative, name)
+                    paths.append(name)
+        paths.sort()
+        return paths
+
+    def scan(self):
+        """bring the statistics up to date, returns the files recounted"""
+        files = {}
+        stale = []
+        for path in self.walk():
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue
+            entry = self.files.get(path)
+            if entry and entry[:2] == (stat.st_size, stat.st_mtime):
+                files[path] = entry
+            else:
+                stale.append(path)
+        counted = count_files([os.path.join(self.root, path)
+                               for path in stale])
+        for path, entry in zip(stale, counted):
+            if entry is not None:
+                files[path] = entry
+        changed = files != self.files
+        self.files = files
+        if changed:
+            try:
+                self.save_cache()
+            except (IOError, OSError):
+                pass
+        return len(stale)
+
+    def filenames(self):
+        """absolute paths of the files, in order"""
+        return [os.path.join(self.root, path) for path in sorted(self.files)]
+
+    def totals(self, overrides=None):
+        """(files, characters, words, lines) of the whole project
+
+        overrides maps absolute paths to counts to use instead of the ones
+        on disk, for files being edited"""
+        overrides = overrides or {}
+        chars = words = lines = 0
+        for path, entry in self.files.iteritems():
+            counts = overrides.get(os.path.join(self.root, path), entry[2:])
+            chars += counts[0]
+            words += counts[1]
+            lines += counts[2]
+        return len(self.files), chars, words, lines
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+hand files over to an already running pyroom
+
+the first pyroom of a user listens on a unix domain socket in a private
+directory; later invocations with a plain list of files send the file names
+there and exit instead of starting a whole new editor
+
+this module is imported before gtk, keep it light
+"""
+
+import gobject
+import os
+import socket
+import stat
+import tempfile
+
+TIMEOUT = 2.0  # Seconds to wait for the running instance to answer
+ACK = 'ok\n'
+
+
+def socket_path():
+    """path of the per-user socket, its directory is created if needed"""
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = os.path.join(tempfile.gettempdir(),
+                                 'pyroom-%d' % os.getuid())
+        if not os.path.isdir(directory):
+            os.mkdir(directory, 0700)
+    info = os.lstat(directory)
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0077:
+        raise OSError('%s is not a private directory' % directory)
+    return os.path.join(directory, 'pyroom.socket')
+
+
+def connect():
+    """socket connected to the running instance, or None"""
+    try:
+        path = socket_path()
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(TIMEOUT)
+        client.connect(path)
+    except (socket.error, OSError):
+        return None
+    return client
+
+
+def forward(filenames):
+    """send filenames to the running instance, returns whether it took them"""
+    client = connect()
+    if client is None:
+        return False
+    try:
+        try:
+            client.sendall('\0'.join([os.path.abspath(filename)
+                                      for filename in filenames]))
+            client.shutdown(socket.SHUT_WR)
+            return client.recv(len(ACK)) == ACK
+        except socket.error:
+            return False
+    finally:
+        client.close()
+
+
+class InstanceServer(object):
+    """accepts file lists from later invocations"""
+
+    def __init__(self, edit_instance):
+        self.edit_instance = edit_instance
+        self.path = None
+        self.server = None
+        self.watch = 0
+        client = connect()
+        if client is not None:
+            # somebody else is serving already
+            client.close()
+            return
+        try:
+            path = socket_path()
+            if os.path.exists(path):
+                os.unlink(path)
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(path)
+            server.listen(5)
+        except (socket.error, OSError):
+            return
+        self.path = path
+        self.server = server
+        self.watch = gobject.io_add_watch(server, gobject.IO_IN, self.accept)
+
+    def accept(self, server, condition):
+        """a new invocation connected"""
+        connection = server.accept()[0]
+        connection.setblocking(False)
+        gobject.io_add_watch(connection, gobject.IO_IN | gobject.IO_HUP,
+                             self.receive, [])
+        return True
+
+    def receive(self, connection, condition, chunks):
+        """gather the file names until the sender is done"""
+        try:
+            data = connection.recv(4096)
+        except socket.error:
+            connection.close()
+            return False
+        if data:
+            chunks.append(data)
+            return True
+        for filename in ''.join(chunks).split('\0'):
+            if filename:
+                gobject.idle_add(self.edit_instance.open_file_no_chooser,
+                                 filename)
+        try:
+            connection.setblocking(True)
+            connection.sendall(ACK)
+        except socket.error:
+            pass
+        connection.close()
+        self.edit_instance.window.present()
+        return False
+
+    def close(self):
+        """stop listening"""
+        if self.server is None:
+            return
+        gobject.source_remove(self.watch)
+        self.server.close()
+        self.server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
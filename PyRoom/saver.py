@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+save buffers atomically from a background thread
+
+the buffer text is copied out in chunks on the main thread, then a worker
+thread writes it to a temporary file in the target directory, optionally
+fsyncs it and renames it over the original; completion is reported back to
+the main loop with gobject.idle_add
+
+save_all writes many files from a small pool of threads, which pays off on
+network filesystems where most of the time goes into waiting on the server
+"""
+
+import gobject
+import os
+import stat
+import tempfile
+import threading
+import Queue
+
+# Characters copied out of the buffer per chunk
+CHUNK_SIZE = 1024 * 1024
+# Files written at once when saving everything
+POOL_SIZE = 4
+
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+_worker = None
+
+
+def buffer_chunks(buf, size=CHUNK_SIZE):
+    """copy the buffer text out as a list of utf-8 chunks"""
+    chunks = []
+    start = buf.get_start_iter()
+    while not start.is_end():
+        end = start.copy()
+        end.forward_chars(size)
+        chunks.append(buf.get_text(start, end))
+        start = end
+    return chunks
+
+
+def write_atomic(filename, chunks, fsync=True):
+    """write chunks to a temp file next to filename and rename it over"""
+    filename = os.path.realpath(filename)
+    directory, name = os.path.split(filename)
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError:
+        mode = 0666 & ~UMASK
+    handle, tmp_filename = tempfile.mkstemp(prefix='.%s.' % name,
+        suffix='.tmp', dir=directory)
+    try:
+        out_file = os.fdopen(handle, 'wb')
+        try:
+            for chunk in chunks:
+                out_file.write(chunk)
+            out_file.flush()
+            if fsync:
+                os.fsync(out_file.fileno())
+        finally:
+            out_file.close()
+        os.chmod(tmp_filename, mode)
+        os.rename(tmp_filename, filename)
+    except:
+        os.unlink(tmp_filename)
+        raise
+
+
+class SaveWorker(threading.Thread):
+    """writes queued save jobs one after another"""
+
+    def __init__(self):
+        threading.Thread.__init__(self, name='pyroom-saver')
+        self.setDaemon(True)
+        self.jobs = Queue.Queue()
+
+    def run(self):
+        while True:
+            filename, chunks, fsync, callback, args = self.jobs.get()
+            error = None
+            try:
+                write_atomic(filename, chunks, fsync)
+            except (IOError, OSError), error:
+                pass
+            if callback:
+                gobject.idle_add(callback, filename, error, *args)
+            self.jobs.task_done()
+
+
+def save(filename, chunks, callback=None, fsync=True, *args):
+    """queue chunks to be written to filename
+
+    callback(filename, error, *args) is called from the main loop once the
+    file is on disk, error being None on success"""
+    global _worker
+    if _worker is None:
+        _worker = SaveWorker()
+        _worker.start()
+    _worker.jobs.put((filename, chunks, fsync, callback, args))
+
+
+def wait():
+    """block until every queued save has been written"""
+    if _worker is not None:
+        _worker.jobs.join()
+
+
+def save_all(jobs, callback, fsync=True, *args):
+    """write (filename, chunks) jobs from POOL_SIZE threads at once
+
+    callback(results, *args) is called from the main loop once every file
+    is written or failed, results being (filename, error) pairs in the order
+    of jobs"""
+    jobs = list(jobs)
+    results = [None] * len(jobs)
+    pending = Queue.Queue()
+    for index, job in enumerate(jobs):
+        pending.put((index, job))
+    lock = threading.Lock()
+    remaining = [len(jobs)]
+
+    def work():
+        # saves queued earlier must not land after these
+        wait()
+        while True:
+            try:
+                index, (filename, chunks) = pending.get_nowait()
+            except Queue.Empty:
+                return
+            error = None
+            try:
+                write_atomic(filename, chunks, fsync)
+            except (IOError, OSError), error:
+                pass
+            lock.acquire()
+            try:
+                results[index] = (filename, error)
+                remaining[0] -= 1
+                done = not remaining[0]
+            finally:
+                lock.release()
+            if done:
+                gobject.idle_add(callback, results, *args)
+
+    if not jobs:
+        gobject.idle_add(callback, results, *args)
+    for number in range(min(POOL_SIZE, len(jobs))):
+        thread = threading.Thread(target=work, name='pyroom-saver-%d' % number)
+        thread.setDaemon(True)
+        thread.start()
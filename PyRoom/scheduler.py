@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+one-shot timers
+
+pyroom only sets timers for something that is actually due: an autosave
+after an edit, a status message fading out, a journal flush. None of them
+repeat on their own, so an idle editor does not wake up at all. Delays of a
+second or more go through timeout_add_seconds, which lets glib coalesce the
+wakeup with other timers.
+"""
+
+import gobject
+import time
+
+
+class Timer(object):
+    """calls back once at a deadline, can be armed again afterwards"""
+
+    def __init__(self, callback, *args):
+        self.callback = callback
+        self.args = args
+        self.source = 0
+        self.deadline = None
+
+    def arm(self, delay):
+        """fire in delay seconds, unless already due sooner"""
+        deadline = time.time() + delay
+        if self.source:
+            if deadline >= self.deadline:
+                return
+            gobject.source_remove(self.source)
+        self.deadline = deadline
+        if delay >= 1:
+            self.source = gobject.timeout_add_seconds(int(round(delay)),
+                                                      self.fire)
+        else:
+            self.source = gobject.timeout_add(int(delay * 1000), self.fire)
+
+    def restart(self, delay):
+        """fire in delay seconds, dropping any earlier deadline"""
+        self.cancel()
+        self.arm(delay)
+
+    def cancel(self):
+        """do not fire"""
+        if self.source:
+            gobject.source_remove(self.source)
+            self.source = 0
+            self.deadline = None
+
+    def armed(self):
+        """whether the timer is due to fire"""
+        return bool(self.source)
+
+    def fire(self):
+        """the deadline has come"""
+        self.source = 0
+        self.deadline = None
+        self.callback(*self.args)
+        return False
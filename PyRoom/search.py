@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+incremental find and replace
+
+the buffer is searched a slice of lines at a time from idle callbacks, each
+slice getting a few milliseconds, so typing in the find entry never waits
+for a large document. Match offsets are collected as they are found, only
+the ones in the visible part of the view are highlighted. Matches do not
+span slices, which only matters to regular expressions matching line ends.
+
+What is typed is searched as plain text, or as a regular expression when
+written between slashes; it is case insensitive unless it has capitals.
+
+Finding in all buffers looks the words up in the word counts the buffer
+statistics keep up to date, without going through any text.
+"""
+
+import bisect
+import gobject
+import gtk
+import re
+import time
+
+import scheduler
+import statistics
+
+SLICE_LINES = 500
+SLICE_TIME = 0.01  # Seconds of searching per idle callback
+SEARCH_DELAY = 0.15  # Seconds of typing pause before searching again
+CACHE_SIZE = 32
+
+TAG_NAME = 'pyroom-search-match'
+
+_patterns = {}
+
+
+def is_regex(text):
+    """whether what was typed is a regular expression"""
+    return len(text) > 2 and text.startswith('/') and text.endswith('/')
+
+
+def compile_pattern(text):
+    """the regex for what was typed, None if it is not valid"""
+    if text in _patterns:
+        return _patterns[text]
+    if is_regex(text):
+        source = text[1:-1]
+    else:
+        source = re.escape(text)
+    flags = re.UNICODE | re.MULTILINE
+    if text == text.lower():
+        flags |= re.IGNORECASE
+    try:
+        pattern = re.compile(source, flags)
+    except re.error:
+        pattern = None
+    if len(_patterns) >= CACHE_SIZE:
+        _patterns.popitem()
+    _patterns[text] = pattern
+    return pattern
+
+
+class Search(object):
+    """finds the matches of a pattern in a buffer from idle callbacks"""
+
+    def __init__(self, buf, pattern, on_progress):
+        self.buf = buf
+        self.pattern = pattern
+        self.on_progress = on_progress
+        self.starts = []
+        self.ends = []
+        self.line = 0
+        self.done = False
+        self.idle = gobject.idle_add(self.step)
+
+    def step(self):
+        """search slices of lines until the time is up"""
+        deadline = time.time() + SLICE_TIME
+        line_count = self.buf.get_line_count()
+        while self.line < line_count:
+            start = self.buf.get_iter_at_line(self.line)
+            self.line += SLICE_LINES
+            if self.line < line_count:
+                end = self.buf.get_iter_at_line(self.line)
+            else:
+                end = self.buf.get_end_iter()
+            text = unicode(self.buf.get_slice(start, end), 'utf-8')
+            offset = start.get_offset()
+            for match in self.pattern.finditer(text):
+                if match.end() > match.start():
+                    self.starts.append(offset + match.start())
+                    self.ends.append(offset + match.end())
+            if time.time() > deadline:
+                self.on_progress(self)
+                return True
+        self.idle = 0
+        self.done = True
+        self.on_progress(self)
+        return False
+
+    def cancel(self):
+        """stop searching"""
+        if self.idle:
+            gobject.source_remove(self.idle)
+            self.idle = 0
+
+    def after(self, offset):
+        """index of the first match starting at or after offset, or None"""
+        index = bisect.bisect_left(self.starts, offset)
+        if index < len(self.starts):
+            return index
+        return None
+
+    def before(self, offset):
+        """index of the last match starting before offset, or None"""
+        index = bisect.bisect_left(self.starts, offset) - 1
+        if index >= 0:
+            return index
+        return None
+
+
+class SearchBar(object):
+    """the find and replace entries and what they do to the current buffer"""
+
+    def __init__(self, edit_instance):
+        self.edit = edit_instance
+        self.textbox = edit_instance.textbox
+        self.find_entry = edit_instance.gui.find_entry
+        self.replace_entry = edit_instance.gui.replace_entry
+        self.search = None
+        self.pending = None
+        self.highlighted = None
+        self.search_timer = scheduler.Timer(self.start_search)
+        self.find_entry.connect('changed', self.find_changed)
+        self.find_entry.connect('key-press-event', self.key_press)
+        self.replace_entry.connect('key-press-event', self.key_press)
+        edit_instance.gui.scrolled.get_vadjustment().connect('value-changed',
+            self.view_scrolled)
+
+    def show(self, replace=False):
+        """open the bar, with the replace entry or not"""
+        self.find_entry.show()
+        if replace:
+            self.replace_entry.show()
+        else:
+            self.replace_entry.hide()
+        self.find_entry.grab_focus()
+        self.find_entry.select_region(0, -1)
+        if self.find_entry.get_text():
+            self.start_search()
+
+    def buffer_switched(self):
+        """search the buffer switched to instead"""
+        if self.find_entry.get_property('visible'):
+            self.start_search()
+
+    def hide(self):
+        """close the bar and forget the search"""
+        self.search_timer.cancel()
+        self.pending = None
+        self.stop_search()
+        self.find_entry.hide()
+        self.replace_entry.hide()
+        self.textbox.grab_focus()
+
+    def key_press(self, widget, event):
+        """Enter finds, Shift-Enter finds backwards, Enter in the replace
+        entry replaces, Control-Enter there replaces all, Escape closes"""
+        if event.keyval == gtk.keysyms.Escape:
+            self.hide()
+            return True
+        if event.keyval not in (gtk.keysyms.Return, gtk.keysyms.KP_Enter):
+            return False
+        if widget is self.replace_entry:
+            if event.state & gtk.gdk.CONTROL_MASK:
+                self.replace_all()
+            else:
+                self.replace()
+        else:
+            self.find(backwards=event.state & gtk.gdk.SHIFT_MASK)
+        return True
+
+    def find_changed(self, entry):
+        """search again once typing pauses"""
+        self.search_timer.restart(SEARCH_DELAY)
+
+    def get_pattern(self):
+        """the compiled find entry text, None if empty or invalid"""
+        text = unicode(self.find_entry.get_text(), 'utf-8')
+        if not text:
+            return None
+        pattern = compile_pattern(text)
+        if pattern is None:
+            self.edit.status.set_text(_('Invalid regular expression'))
+        return pattern
+
+    def start_search(self):
+        """search the current buffer for the find entry text"""
+        self.stop_search()
+        pattern = self.get_pattern()
+        if pattern is None:
+            return
+        buf = self.edit.buffers[self.edit.current]
+        self.search = Search(buf, pattern, self.search_progress)
+        self.search.changed_handler = buf.connect('changed',
+                                                  self.buffer_changed)
+
+    def stop_search(self):
+        """forget the current search and its highlights"""
+        self.clear_highlights()
+        if self.search is not None:
+            self.search.cancel()
+            self.search.buf.disconnect(self.search.changed_handler)
+            self.search = None
+
+    def buffer_changed(self, buf):
+        """match offsets are stale after an edit"""
+        self.search_timer.restart(SEARCH_DELAY)
+
+    def search_progress(self, search):
+        """more matches have been found"""
+        if search.done:
+            self.edit.status.set_text(_('%d match(es)') % len(search.starts))
+        else:
+            self.edit.status.set_text(_('Searching, %d match(es) so far')
+                                      % len(search.starts))
+        self.highlight()
+        if self.pending is not None:
+            self.find(self.pending)
+
+    def view_scrolled(self, adjustment):
+        """highlight the matches that scrolled into view"""
+        if self.search is not None:
+            self.highlight()
+
+    def get_tag(self, buf):
+        """the tag highlighting matches, in the border color of the theme"""
+        tag = buf.get_tag_table().lookup(TAG_NAME)
+        if tag is None:
+            tag = buf.create_tag(TAG_NAME)
+        tag.set_property('background-gdk',
+            self.edit.gui.boxout.get_style().bg[0])
+        return tag
+
+    def clear_highlights(self):
+        """remove the highlights applied so far, edits may have moved them"""
+        if self.highlighted is not None:
+            buf = self.highlighted
+            buf.remove_tag_by_name(TAG_NAME, buf.get_start_iter(),
+                                   buf.get_end_iter())
+            self.highlighted = None
+
+    def highlight(self):
+        """highlight the matches in the visible part of the view"""
+        search = self.search
+        buf = search.buf
+        if buf is not self.textbox.get_buffer():
+            return
+        rect = self.textbox.get_visible_rect()
+        start = self.textbox.get_iter_at_location(rect.x, rect.y).get_offset()
+        end = self.textbox.get_iter_at_location(rect.x + rect.width,
+            rect.y + rect.height)
+        end.forward_to_line_end()
+        end = end.get_offset()
+        self.clear_highlights()
+        tag = self.get_tag(buf)
+        index = bisect.bisect_left(search.ends, start)
+        while index < len(search.starts) and search.starts[index] < end:
+            buf.apply_tag(tag, buf.get_iter_at_offset(search.starts[index]),
+                          buf.get_iter_at_offset(search.ends[index]))
+            index += 1
+        self.highlighted = buf
+
+    def select(self, index):
+        """select a match and bring it into view"""
+        buf = self.search.buf
+        buf.select_range(buf.get_iter_at_offset(self.search.ends[index]),
+                         buf.get_iter_at_offset(self.search.starts[index]))
+        self.textbox.scroll_to_mark(buf.get_insert(), 0.0, True, 0.0, 0.3)
+
+    def find(self, backwards=False):
+        """select the next match after the cursor, or the one before; if
+        the search has not got that far yet, do it once it has"""
+        self.pending = None
+        if self.search is None or self.search_timer.armed():
+            self.search_timer.cancel()
+            self.start_search()
+            if self.search is None:
+                return
+        search = self.search
+        buf = search.buf
+        cursor = buf.get_iter_at_mark(buf.get_insert()).get_offset()
+        selection = buf.get_selection_bounds()
+        if selection:
+            cursor = selection[0].get_offset()
+        if backwards:
+            if not (search.done or search.after(cursor) is not None):
+                self.pending = backwards
+                return
+            index = search.before(cursor)
+            if index is None and search.starts:
+                index = len(search.starts) - 1
+        else:
+            index = search.after(cursor + bool(selection))
+            if index is None and not search.done:
+                self.pending = backwards
+                return
+            if index is None and search.starts:
+                index = 0
+        if index is None:
+            self.edit.status.set_text(_('Not found'))
+        else:
+            self.select(index)
+
+    def replacement(self, match):
+        """the text a match is replaced with, \\1 and \\g<name> refer to
+        groups when searching for a regular expression"""
+        text = unicode(self.replace_entry.get_text(), 'utf-8')
+        if is_regex(unicode(self.find_entry.get_text(), 'utf-8')):
+            return match.expand(text)
+        return text
+
+    def read_only(self, buf):
+        """whether buf cannot be edited now, saying why in the status"""
+        if buf.pager:
+            self.edit.status.set_text(_('File %s is read-only')
+                                      % buf.filename)
+        elif buf.loader:
+            self.edit.status.set_text(_('File %s is still loading')
+                                      % buf.filename)
+        else:
+            return False
+        return True
+
+    def replace(self):
+        """replace the selected match, then select the next one"""
+        pattern = self.get_pattern()
+        buf = self.edit.buffers[self.edit.current]
+        if self.read_only(buf):
+            return
+        selection = buf.get_selection_bounds()
+        if pattern is not None and selection:
+            start, end = selection
+            text = unicode(buf.get_slice(start, end), 'utf-8')
+            match = pattern.match(text)
+            if match and match.end() == len(text):
+                replacement = self.replacement(match)
+                buf.begin_user_action()
+                buf.delete(start, end)
+                buf.insert(start, replacement)
+                buf.end_user_action()
+        self.find()
+
+    def replace_all(self):
+        """replace every match in a single undoable step"""
+        pattern = self.get_pattern()
+        if pattern is None:
+            return
+        buf = self.edit.buffers[self.edit.current]
+        if self.read_only(buf):
+            return
+        text = unicode(buf.get_text(buf.get_start_iter(),
+                                    buf.get_end_iter()), 'utf-8')
+        matches = [match for match in pattern.finditer(text)
+                   if match.end() > match.start()]
+        self.stop_search()
+        buf.begin_user_action()
+        for match in reversed(matches):
+            start = buf.get_iter_at_offset(match.start())
+            end = buf.get_iter_at_offset(match.end())
+            buf.delete(start, end)
+            buf.insert(start, self.replacement(match))
+        buf.end_user_action()
+        self.edit.status.set_text(_('%d match(es) replaced') % len(matches))
+
+
+class FindAllDialog(object):
+    """lists the open buffers holding some words, from the word index"""
+
+    def __init__(self, edit_instance):
+        self.edit = edit_instance
+        self.dialog = None
+
+    def build(self):
+        """create the dialog on first use"""
+        self.dialog = gtk.Dialog(_('Find in all buffers'), self.edit.window,
+            gtk.DIALOG_MODAL | gtk.DIALOG_DESTROY_WITH_PARENT,
+            (gtk.STOCK_CLOSE, gtk.RESPONSE_CLOSE))
+        self.dialog.set_default_size(480, 360)
+        self.dialog.connect('response', self.hide)
+        self.dialog.connect('delete-event', self.hide)
+        self.entry = gtk.Entry()
+        self.entry.connect('changed', self.update)
+        self.entry.connect('activate', self.activate_first)
+        # buffer number, buffer name, occurrences
+        self.store = gtk.ListStore(int, str, int)
+        self.view = gtk.TreeView(self.store)
+        for column, title in enumerate((_('Buffer'), _('File'),
+                                        _('Occurrences'))):
+            self.view.append_column(gtk.TreeViewColumn(title,
+                gtk.CellRendererText(), text=column))
+        self.view.connect('row-activated', self.row_activated)
+        scrolled = gtk.ScrolledWindow()
+        scrolled.set_policy(gtk.POLICY_AUTOMATIC, gtk.POLICY_AUTOMATIC)
+        scrolled.add(self.view)
+        self.dialog.vbox.set_spacing(6)
+        self.dialog.vbox.pack_start(self.entry, False, False, 0)
+        self.dialog.vbox.pack_start(scrolled, True, True, 0)
+
+    def show(self):
+        """ask for words to look for"""
+        if self.dialog is None:
+            self.build()
+        self.dialog.show_all()
+        self.entry.grab_focus()
+        self.entry.select_region(0, -1)
+        self.update()
+
+    def hide(self, *args):
+        """close the dialog"""
+        self.dialog.hide()
+        return True
+
+    def update(self, entry=None):
+        """list the buffers holding every word typed"""
+        found = self.edit.word_index.query(
+            unicode(self.entry.get_text(), 'utf-8'))
+        self.store.clear()
+        for index, buf in enumerate(self.edit.buffers):
+            if buf in found:
+                self.store.append((index + 1, buf.filename, found[buf]))
+
+    def activate_first(self, entry):
+        """Enter in the entry goes to the first buffer listed"""
+        if len(self.store):
+            self.jump(self.store[0][0] - 1)
+
+    def row_activated(self, view, path, column):
+        """go to the buffer of a row"""
+        self.jump(self.store[path][0] - 1)
+
+    def jump(self, index):
+        """switch to a buffer and find the first word typed in it"""
+        words = statistics.index_words(unicode(self.entry.get_text(),
+                                               'utf-8'))
+        self.hide()
+        self.edit.set_buffer(index)
+        buf = self.edit.buffers[index]
+        buf.place_cursor(buf.get_start_iter())
+        if words:
+            self.edit.search_bar.find_entry.set_text(words[0])
+            self.edit.search_bar.show()
+            self.edit.search_bar.find()
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+autosave history store
+
+every autosave snapshot is cut into chunks at content defined line
+boundaries, so an edit only changes the chunks around it. Chunks are stored
+zlib-compressed under the sha1 of their text, and shared between all the
+snapshots that contain them. A snapshot is a manifest listing its source
+file and chunks, named after the time it was taken; manifests never change
+once written, so a journal can use one as its base.
+
+The store lives in $XDG_DATA_HOME/pyroom/snapshots. After a write, when the
+index shows it may be over its limits and it was not pruned in the last
+hour, it is pruned, keeping the last keep_count snapshots of each file, none
+older than max_age and at most max_bytes in total. Snapshots that journals
+are based on are always kept.
+
+An index file lists every snapshot with the time it was taken, the size and
+sha1 of its text and its source file, one per line, oldest first. It is all
+pyroom needs to read at startup to find the autosaves newer than their files.
+"""
+
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+import zlib
+from xdg.BaseDirectory import xdg_data_home
+
+STORE_FOLDER = os.path.join(xdg_data_home, 'pyroom', 'snapshots')
+CHUNK_FOLDER = os.path.join(STORE_FOLDER, 'chunks')
+MANIFEST_FOLDER = os.path.join(STORE_FOLDER, 'manifests')
+INDEX = os.path.join(STORE_FOLDER, 'index')
+HEADER = 'PYROOM-SNAPSHOT 1\n'
+
+COMPRESSION_LEVEL = 6
+BOUNDARY_MASK = 0x1f  # A line ends a chunk once in 32 on average
+MIN_CHUNK = 1024
+MAX_CHUNK = 64 * 1024
+
+# Retention, set from the preferences; 0 means no limit
+keep_count = 10
+max_age = 7 * 24 * 60 * 60
+max_bytes = 64 * 1024 * 1024
+
+PRUNE_INTERVAL = 60 * 60  # Seconds between two prunes at most
+_last_prune = 0
+
+
+def split_chunks(text):
+    """cut utf-8 text into chunks ending at content defined lines"""
+    chunks = []
+    start = 0
+    position = 0
+    length = len(text)
+    while position < length:
+        end = text.find('\n', position, start + MAX_CHUNK)
+        if end < 0:
+            end = min(start + MAX_CHUNK, length)
+        else:
+            end += 1
+        line = text[position:end]
+        position = end
+        if (position - start >= MIN_CHUNK
+            and not zlib.crc32(line) & BOUNDARY_MASK
+            or position - start >= MAX_CHUNK or position == length):
+            chunks.append(text[start:position])
+            start = position
+    return chunks
+
+
+def chunk_path(digest):
+    """where the chunk with this sha1 is stored"""
+    return os.path.join(CHUNK_FOLDER, digest[:2], digest[2:])
+
+
+def is_snapshot(filename):
+    """whether filename is a manifest of the store"""
+    return os.path.dirname(filename) == MANIFEST_FOLDER
+
+
+def locked(function):
+    """run function holding the store lock, other pyrooms share the store"""
+    def wrapper(*args, **kwargs):
+        if not os.path.isdir(STORE_FOLDER):
+            os.makedirs(STORE_FOLDER)
+        lock_file = open(os.path.join(STORE_FOLDER, 'lock'), 'w')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            return function(*args, **kwargs)
+        finally:
+            lock_file.close()
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+@locked
+def store(source, text):
+    """add a snapshot of source holding the utf-8 text, returns its manifest"""
+    digests = []
+    for chunk in split_chunks(text):
+        digest = hashlib.sha1(chunk).hexdigest()
+        path = chunk_path(digest)
+        if not os.path.exists(path):
+            write_file(path, zlib.compress(chunk, COMPRESSION_LEVEL))
+        digests.append(digest)
+    stamp = time.time()
+    text_digest = hashlib.sha1(text).hexdigest()
+    name = '%013d-%s' % (stamp * 1000, text_digest[:12])
+    manifest = os.path.join(MANIFEST_FOLDER, name)
+    write_file(manifest, '%s%s\n%s' % (HEADER, source,
+        ''.join([digest + '\n' for digest in digests])))
+    index_file = open(INDEX, 'a')
+    try:
+        index_file.write(index_line((name, stamp, len(text), text_digest, '',
+                                     source)))
+    finally:
+        index_file.close()
+    return manifest
+
+
+def write_file(filename, data):
+    """write data to a new file, whole or not at all"""
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    handle, tmp_filename = tempfile.mkstemp(prefix='.', dir=directory)
+    try:
+        out_file = os.fdopen(handle, 'wb')
+        try:
+            out_file.write(data)
+        finally:
+            out_file.close()
+        os.rename(tmp_filename, filename)
+    except:
+        os.unlink(tmp_filename)
+        raise
+
+
+def read_manifest(manifest):
+    """source and chunk digests of a snapshot"""
+    manifest_file = open(manifest, 'rb')
+    try:
+        lines = manifest_file.read().split('\n')
+    finally:
+        manifest_file.close()
+    if lines[0] + '\n' != HEADER or lines[-1]:
+        raise IOError('%s is not a pyroom snapshot' % manifest)
+    return lines[1], lines[2:-1]
+
+
+def load(manifest):
+    """utf-8 text of a snapshot"""
+    chunks = []
+    for digest in read_manifest(manifest)[1]:
+        chunk_file = open(chunk_path(digest), 'rb')
+        try:
+            chunks.append(zlib.decompress(chunk_file.read()))
+        finally:
+            chunk_file.close()
+    return ''.join(chunks)
+
+
+def index_line(entry):
+    """the index line of an entry"""
+    return '%s\t%r\t%d\t%s\t%s\t%s\n' % entry
+
+
+def read_index():
+    """(name, time, size, sha1, flags, source) of every snapshot, oldest
+    first"""
+    entries = []
+    try:
+        index_file = open(INDEX, 'rb')
+    except IOError:
+        return entries
+    try:
+        for line in index_file:
+            fields = line[:-1].split('\t', 5)
+            if len(fields) != 6 or not line.endswith('\n'):
+                continue
+            name, stamp, size, digest, flags, source = fields
+            try:
+                entries.append((name, float(stamp), int(size), digest, flags,
+                                source))
+            except ValueError:
+                continue
+    finally:
+        index_file.close()
+    return entries
+
+
+def write_index(entries):
+    """replace the index"""
+    write_file(INDEX, ''.join([index_line(entry) for entry in entries]))
+
+
+def recoverable(exclude=()):
+    """index entries of the latest snapshots that are newer than their
+    source file, leaving out the sources in exclude and dismissed ones"""
+    latest = {}
+    for entry in read_index():
+        latest[entry[5]] = entry
+    entries = []
+    for source, entry in latest.items():
+        if not source or source in exclude or 'd' in entry[4]:
+            continue
+        try:
+            newer = entry[1] > os.stat(source).st_mtime
+        except OSError:
+            # deleted since, the snapshot is all that is left
+            newer = True
+        if newer:
+            entries.append(entry)
+    entries.sort(key=lambda entry: entry[1])
+    return entries
+
+
+@locked
+def dismiss(names):
+    """do not offer to recover these snapshots again"""
+    entries = []
+    for entry in read_index():
+        if entry[0] in names and 'd' not in entry[4]:
+            entry = entry[:4] + (entry[4] + 'd',) + entry[5:]
+        entries.append(entry)
+    write_index(entries)
+
+
+@locked
+def dismiss_sources(sources):
+    """do not offer to recover any snapshot of these source files again"""
+    entries = []
+    for entry in read_index():
+        if entry[5] in sources and 'd' not in entry[4]:
+            entry = entry[:4] + (entry[4] + 'd',) + entry[5:]
+        entries.append(entry)
+    write_index(entries)
+
+
+def over_limits(entries):
+    """whether index entries may be over the retention limits; their sizes
+    are those of the text, the store takes less"""
+    now = time.time()
+    per_source = {}
+    total = 0
+    for entry in entries:
+        per_source[entry[5]] = per_source.get(entry[5], 0) + 1
+        if keep_count and per_source[entry[5]] > keep_count:
+            return True
+        if max_age and now - entry[1] > max_age:
+            return True
+        total += entry[2]
+    return bool(max_bytes) and total > max_bytes
+
+
+def prune_due():
+    """whether to prune after a write: not lately, and the index shows the
+    store may be over its limits"""
+    if time.time() - _last_prune < PRUNE_INTERVAL:
+        return False
+    return over_limits(read_index())
+
+
+@locked
+def prune(protect=()):
+    """apply the retention policy, then drop chunks no snapshot uses"""
+    global _last_prune
+    _last_prune = time.time()
+    if not os.path.isdir(MANIFEST_FOLDER):
+        return
+    now = time.time()
+    manifests = []
+    refs = {}
+    total = 0
+    for name in sorted(os.listdir(MANIFEST_FOLDER)):
+        if name.startswith('.'):
+            continue
+        manifest = os.path.join(MANIFEST_FOLDER, name)
+        try:
+            source, digests = read_manifest(manifest)
+            size = os.path.getsize(manifest)
+        except (IOError, OSError):
+            continue
+        manifests.append((manifest, source, digests, size,
+                          int(name.split('-')[0]) / 1000.0))
+        for digest in digests:
+            refs[digest] = refs.get(digest, 0) + 1
+        total += size
+    sizes = {}
+    for directory, dirs, names in os.walk(CHUNK_FOLDER):
+        for name in names:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(directory, name)
+            digest = os.path.basename(directory) + name
+            if digest not in refs:
+                # left over by an earlier prune or a crash
+                os.unlink(path)
+                continue
+            sizes[digest] = os.path.getsize(path)
+            total += sizes[digest]
+
+    dropped = set()
+
+    def drop(entry):
+        """delete a manifest and the chunks only it used"""
+        manifest, source, digests, size, stamp = entry
+        os.unlink(manifest)
+        dropped.add(os.path.basename(manifest))
+        freed = size
+        for digest in digests:
+            refs[digest] -= 1
+            if not refs[digest] and digest in sizes:
+                os.unlink(chunk_path(digest))
+                freed += sizes.pop(digest)
+        return freed
+
+    kept = []
+    per_source = {}
+    for entry in reversed(manifests):
+        per_source[entry[1]] = per_source.get(entry[1], 0) + 1
+        if entry[0] in protect:
+            kept.append(entry)
+        elif keep_count and per_source[entry[1]] > keep_count:
+            total -= drop(entry)
+        elif max_age and now - entry[4] > max_age:
+            total -= drop(entry)
+        else:
+            kept.append(entry)
+    # oldest first
+    for entry in reversed(kept):
+        if not max_bytes or total <= max_bytes:
+            break
+        if entry[0] not in protect:
+            total -= drop(entry)
+
+    present = set([os.path.basename(entry[0]) for entry in kept]) - dropped
+    index = read_index()
+    entries = [entry for entry in index if entry[0] in present]
+    indexed = set([entry[0] for entry in entries])
+    for manifest, source, digests, size, stamp in kept:
+        name = os.path.basename(manifest)
+        if name in indexed or name not in present:
+            continue
+        # written before there was an index, or lost with it
+        try:
+            text = load(manifest)
+        except IOError:
+            continue
+        entries.append((name, stamp, len(text),
+                        hashlib.sha1(text).hexdigest(), '', source))
+    if entries != index:
+        entries.sort(key=lambda entry: entry[0])
+        write_index(entries)
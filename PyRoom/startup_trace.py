@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+startup trace
+
+timestamps the phases of pyroom's startup and writes them out as JSON once
+the main window is first exposed. Enabled with --trace-startup=FILE or the
+PYROOM_STARTUP_TRACE=FILE environment variable, FILE being - for stderr.
+With PYROOM_STARTUP_TRACE_QUIT set pyroom quits right after writing the
+report, which is what benchmarks/startup.py relies on.
+
+This module is imported before anything else, keep it light.
+"""
+
+import json
+import os
+import sys
+import time
+
+import PyRoom
+
+ENV_VAR = 'PYROOM_STARTUP_TRACE'
+QUIT_ENV_VAR = 'PYROOM_STARTUP_TRACE_QUIT'
+OPTION = '--trace-startup'
+
+ORIGIN = time.time()
+
+
+def find_destination(argv):
+    """report destination from the command line or environment, or None"""
+    for index, arg in enumerate(argv):
+        if arg.startswith(OPTION + '='):
+            return arg[len(OPTION) + 1:]
+        if arg == OPTION and index + 1 < len(argv):
+            return argv[index + 1]
+    return os.environ.get(ENV_VAR)
+
+DESTINATION = find_destination(sys.argv[1:])
+
+_phases = []
+_open = {}
+_extra = {}
+
+
+def process_start():
+    """wall clock time the process was started at, None if unknown"""
+    try:
+        stat_file = open('/proc/self/stat')
+        fields = stat_file.read().rsplit(')', 1)[1].split()
+        stat_file.close()
+        uptime_file = open('/proc/uptime')
+        uptime = float(uptime_file.read().split()[0])
+        uptime_file.close()
+        ticks = os.sysconf('SC_CLK_TCK')
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+    # starttime is the 20th field after the command name
+    started = float(fields[19]) / ticks
+    return time.time() - (uptime - started)
+
+
+def enabled():
+    """whether startup is being traced"""
+    return DESTINATION is not None
+
+
+def begin(name):
+    """a phase starts"""
+    if DESTINATION is not None:
+        _open[name] = time.time()
+
+
+def end(name):
+    """a phase ends"""
+    if DESTINATION is not None and name in _open:
+        start = _open.pop(name)
+        _phases.append({
+            'name': name,
+            'start': start - ORIGIN,
+            'duration': time.time() - start,
+        })
+
+
+def add(key, value):
+    """attach extra data to the report"""
+    if DESTINATION is not None:
+        _extra[key] = value
+
+
+def report():
+    """the trace as a dictionary"""
+    data = {
+        'version': PyRoom.__VERSION__,
+        'python': sys.version.split()[0],
+        'pid': os.getpid(),
+        'origin': ORIGIN,
+        'elapsed': time.time() - ORIGIN,
+        'phases': _phases,
+    }
+    started = process_start()
+    if started is not None:
+        data['interpreter'] = ORIGIN - started
+    data.update(_extra)
+    return data
+
+
+def write():
+    """write the report to its destination"""
+    if DESTINATION is None:
+        return
+    if DESTINATION == '-':
+        out_file = sys.stderr
+    else:
+        out_file = open(DESTINATION, 'w')
+    json.dump(report(), out_file, indent=2, sort_keys=True)
+    out_file.write('\n')
+    if out_file is not sys.stderr:
+        out_file.close()
+
+
+class ExposeWatch(object):
+    """writes the report once a window is first drawn"""
+
+    def __init__(self, window, quit_callback, extra=None):
+        self.quit_callback = quit_callback
+        self.extra = extra
+        begin('first expose')
+        self.handler = window.connect_after('expose-event', self.exposed)
+
+    def exposed(self, window, event):
+        """the window has been drawn for the first time"""
+        window.disconnect(self.handler)
+        end('first expose')
+        if self.extra:
+            for key, value in self.extra().items():
+                add(key, value)
+        write()
+        if os.environ.get(QUIT_ENV_VAR):
+            self.quit_callback()
+        return False
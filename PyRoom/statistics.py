@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+incremental document statistics
+
+buffers keep the word count of every line (paragraph) up to date from their
+insert-text and delete-range signals, so only the lines touched by an edit
+are measured again and totals are available in constant time
+
+this module does not import gtk, the word counting rules are shared with
+tools that run without a display
+"""
+
+import re
+
+# A word is a run of letters and digits, apostrophes inside a word do not
+# split it, like pango's word boundaries for ordinary prose
+WORD_RE = re.compile(ur"[^\W_]+(?:['’][^\W_]+)*", re.UNICODE)
+
+# Rough bytes taken by the count of a line and by a distinct word of a buffer
+LINE_BYTES = 8
+WORD_BYTES = 100
+
+
+def count_words(text):
+    """count the words in a unicode string"""
+    return len(WORD_RE.findall(text))
+
+
+def index_words(text):
+    """the words of a unicode string, as the word index keys them"""
+    return tuple([word.lower() for word in WORD_RE.findall(text)])
+
+
+class BufferStatistics(object):
+    """running word, character and line counts of a buffer
+
+    the word count of every line (paragraph) is kept up to date from the
+    insert-text and delete-range signals, so only the lines touched by an
+    edit are measured again, along with how many times each word occurs in
+    the buffer, which a WordIndex shared by the buffers looks up. A
+    paragraph is a run of lines holding words, their first lines are found
+    when asked for and kept until the next edit"""
+
+    def __init__(self, buf, index=None):
+        self.buf = buf
+        self.values = []
+        self.counts = {}
+        self.paragraphs = None
+        self.index = index
+        self.first_line = 0
+        self.last_line = 0
+        self.removed = ()
+        self.frozen = False
+        self.recount()
+        if index is not None:
+            index.add(buf, self.counts)
+        self.handlers = [
+            buf.connect('insert-text', self.before_insert),
+            buf.connect_after('insert-text', self.after_insert),
+            buf.connect('delete-range', self.before_delete),
+            buf.connect_after('delete-range', self.after_delete),
+        ]
+
+    def measure_lines(self, first, last, found):
+        """the word count of each of the lines first to last, inclusive;
+        found is called with the words of each line"""
+        values = []
+        for line in xrange(first, last + 1):
+            start = self.buf.get_iter_at_line(line)
+            end = start.copy()
+            if not end.ends_line():
+                end.forward_to_line_end()
+            line_words = index_words(unicode(self.buf.get_slice(start, end),
+                                             'utf-8'))
+            values.append(len(line_words))
+            found(line_words)
+        return values
+
+    def recount(self):
+        """measure the whole buffer, after it was filled while frozen"""
+        self.counts.clear()
+        self.values = self.measure_lines(0, self.buf.get_line_count() - 1,
+                                         self.add_words)
+        self.words = sum(self.values)
+        self.paragraphs = None
+
+    def add_words(self, words):
+        """words entered the buffer"""
+        counts = self.counts
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+
+    def remove_words(self, words):
+        """words left the buffer"""
+        counts = self.counts
+        for word in words:
+            if counts[word] == 1:
+                del counts[word]
+            else:
+                counts[word] -= 1
+
+    def replace_lines(self, first, last, new_last):
+        """lines first to last, whose words were taken before the edit,
+        became lines first to new_last"""
+        self.remove_words(self.removed)
+        self.removed = ()
+        values = self.measure_lines(first, new_last, self.add_words)
+        self.words += sum(values) - sum(self.values[first:last + 1])
+        self.values[first:last + 1] = values
+        self.paragraphs = None
+
+    def before_insert(self, buf, text_iter, text, length):
+        """remember where the insertion starts and the words there"""
+        self.first_line = text_iter.get_line()
+        if not self.frozen:
+            self.removed = []
+            self.measure_lines(self.first_line, self.first_line,
+                               self.removed.extend)
+
+    def after_insert(self, buf, text_iter, text, length):
+        """text_iter now points at the end of the inserted text"""
+        if not self.frozen:
+            self.replace_lines(self.first_line, self.first_line,
+                               text_iter.get_line())
+
+    def before_delete(self, buf, start, end):
+        """remember the lines the deletion spans and their words"""
+        self.first_line = start.get_line()
+        self.last_line = end.get_line()
+        if not self.frozen:
+            self.removed = []
+            self.measure_lines(self.first_line, self.last_line,
+                               self.removed.extend)
+
+    def after_delete(self, buf, start, end):
+        """the spanned lines have been merged into one"""
+        if not self.frozen:
+            self.replace_lines(self.first_line, self.last_line,
+                               self.first_line)
+
+    def freeze(self):
+        """stop following the edits, while hibernation takes the text out
+        and puts it back as it was, or while a file is loaded, after which
+        the buffer is recounted"""
+        self.frozen = True
+
+    def thaw(self):
+        """follow the edits again"""
+        self.frozen = False
+
+    def disconnect(self):
+        """stop following the buffer and take it out of the index"""
+        for handler in self.handlers:
+            self.buf.disconnect(handler)
+        self.handlers = []
+        if self.index is not None:
+            self.index.remove(self.buf)
+            self.index = None
+
+    def memory_size(self):
+        """rough memory use of the counts, in bytes"""
+        return (LINE_BYTES * len(self.values)
+                + WORD_BYTES * len(self.counts))
+
+    def paragraph_lines(self):
+        """first line of every paragraph"""
+        if self.paragraphs is None:
+            previous = 0
+            self.paragraphs = []
+            for line, words in enumerate(self.values):
+                if words and not previous:
+                    self.paragraphs.append(line)
+                previous = words
+        return self.paragraphs
+
+    def get_chars(self):
+        """character count, kept by the buffer itself"""
+        return self.buf.get_char_count()
+
+    def get_lines(self):
+        """line count"""
+        return len(self.values)
+
+
+class WordIndex(object):
+    """the word counts of the open buffers, to find which hold some words
+
+    there is no inverted index: every buffer already keeps a count of each
+    of its words, so a query looks the words up in each buffer in turn,
+    which costs a dictionary lookup per word and buffer and no memory"""
+
+    def __init__(self):
+        # buffer: its word counts, kept up to date by its statistics
+        self.buffers = {}
+
+    def add(self, buf, counts):
+        """look words up in the counts of buf"""
+        self.buffers[buf] = counts
+
+    def remove(self, buf):
+        """buf is closed"""
+        self.buffers.pop(buf, None)
+
+    def query(self, text):
+        """buffers holding every word of text, with the number of times the
+        rarest of them occurs"""
+        words = set(index_words(text))
+        if not words:
+            return {}
+        found = {}
+        for buf, counts in self.buffers.iteritems():
+            count = min([counts.get(word, 0) for word in words])
+            if count:
+                found[buf] = count
+        return found
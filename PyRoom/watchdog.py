@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+main loop stall watchdog
+
+a thread pings the main loop through idle_add a few times a second and
+keeps a histogram of how long the pings wait to be dispatched. When one
+waits longer than the threshold, the Python stack of the main thread is
+taken, which shows what kept the loop busy: an autosave, a save, a fade, a
+style change...
+
+it is off unless a threshold is given in the preferences (watchdog, in
+miliseconds), the PYROOM_WATCHDOG environment variable or --watchdog; the
+report is part of the buffer information and is appended to
+$XDG_DATA_HOME/pyroom/watchdog.log on quit
+"""
+
+import gobject
+import os
+import sys
+import threading
+import time
+import traceback
+from xdg.BaseDirectory import xdg_data_home
+
+ENV_VAR = 'PYROOM_WATCHDOG'
+LOG_FILE = os.path.join(xdg_data_home, 'pyroom', 'watchdog.log')
+
+PING_INTERVAL = 0.25  # Seconds between the answer to a ping and the next one
+# Upper bounds of the histogram buckets, in miliseconds
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+MAX_STALLS = 50  # Stalls kept with their stack, the latest ones
+
+
+def find_threshold(configured, option=None):
+    """stall threshold in seconds from the option, the environment or the
+    preferences, 0 when disabled"""
+    for value in (option, os.environ.get(ENV_VAR), configured):
+        if value is not None and value != '':
+            try:
+                return max(0, float(value)) / 1000.0
+            except ValueError:
+                continue
+    return 0
+
+
+class Watchdog(threading.Thread):
+    """measures how long the main loop takes to dispatch an idle callback
+
+    must be created on the main thread"""
+
+    def __init__(self, threshold):
+        threading.Thread.__init__(self, name='pyroom-watchdog')
+        self.setDaemon(True)
+        self.threshold = threshold
+        self.main_thread = threading.currentThread().ident
+        self.lock = threading.Lock()
+        self.answered = threading.Event()
+        self.stopped = False
+        self.started = time.time()
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.pings = 0
+        self.worst = 0.0
+        self.stall_count = 0  # All of them, only the latest are kept
+        # [time, latency or None while still stalled, stack]
+        self.stalls = []
+
+    def run(self):
+        while not self.stopped:
+            self.answered.clear()
+            sent = time.time()
+            gobject.idle_add(self.pong, sent, priority=gobject.PRIORITY_DEFAULT)
+            self.answered.wait(self.threshold)
+            if not self.answered.isSet() and not self.stopped:
+                self.stalled(sent)
+                self.answered.wait()
+            time.sleep(PING_INTERVAL)
+
+    def pong(self, sent):
+        """the main loop got to the ping"""
+        latency = time.time() - sent
+        milliseconds = latency * 1000
+        bucket = 0
+        while bucket < len(BUCKETS) and milliseconds > BUCKETS[bucket]:
+            bucket += 1
+        self.lock.acquire()
+        try:
+            self.counts[bucket] += 1
+            self.pings += 1
+            self.worst = max(self.worst, latency)
+            if self.stalls and self.stalls[-1][1] is None:
+                self.stalls[-1][1] = latency
+        finally:
+            self.lock.release()
+        self.answered.set()
+        return False
+
+    def stalled(self, sent):
+        """the ping is late, take the stack of the main thread"""
+        frame = sys._current_frames().get(self.main_thread)
+        if frame is None:
+            stack = []
+        else:
+            stack = traceback.format_stack(frame)
+        del frame
+        self.lock.acquire()
+        try:
+            self.stall_count += 1
+            self.stalls.append([sent, None, stack])
+            del self.stalls[:-MAX_STALLS]
+        finally:
+            self.lock.release()
+
+    def stop(self):
+        """no more pings"""
+        self.stopped = True
+        self.answered.set()
+
+    def percentile(self, fraction):
+        """upper bound in miliseconds of the latency of fraction of the
+        pings, None above the last bucket"""
+        wanted = fraction * self.pings
+        total = 0
+        for bucket, count in enumerate(self.counts):
+            total += count
+            if total >= wanted:
+                if bucket < len(BUCKETS):
+                    return BUCKETS[bucket]
+                return None
+        return None
+
+    def summary(self):
+        """one line for the status label"""
+        self.lock.acquire()
+        try:
+            stalls = self.stall_count
+            if not self.pings:
+                return _('main loop not measured yet')
+            median = self.percentile(0.5)
+            worst = self.percentile(0.99)
+            return _('main loop latency: median under %(median)s ms, 99%% \
+under %(worst)s ms, worst %(max)d ms, %(stalls)d stall(s) over \
+%(threshold)d ms') % {
+                'median': median or '>%d' % BUCKETS[-1],
+                'worst': worst or '>%d' % BUCKETS[-1],
+                'max': self.worst * 1000,
+                'stalls': stalls,
+                'threshold': self.threshold * 1000,
+                }
+        finally:
+            self.lock.release()
+
+    def report(self):
+        """the histogram and the stalls with their stacks, as text"""
+        self.lock.acquire()
+        try:
+            lines = ['pyroom watchdog, %s to %s, %d ping(s), threshold %d \
+ms, %d stall(s), the latest %d listed' % (
+                         time.strftime('%Y-%m-%d %H:%M:%S',
+                                       time.localtime(self.started)),
+                         time.strftime('%Y-%m-%d %H:%M:%S'), self.pings,
+                         self.threshold * 1000, self.stall_count,
+                         len(self.stalls))]
+            lower = 0
+            for bucket, count in enumerate(self.counts):
+                if bucket < len(BUCKETS):
+                    label = '%5d-%d ms' % (lower, BUCKETS[bucket])
+                    lower = BUCKETS[bucket]
+                else:
+                    label = '%5d+ ms' % lower
+                lines.append('  %-14s %d' % (label, count))
+            for sent, latency, stack in self.stalls:
+                if latency is None:
+                    duration = 'still stalled'
+                else:
+                    duration = '%d ms' % (latency * 1000)
+                lines.append('stall at %s, %s, main thread was in:' % (
+                    time.strftime('%H:%M:%S', time.localtime(sent)),
+                    duration))
+                lines.append(''.join(stack).rstrip('\n'))
+            return '\n'.join(lines) + '\n\n'
+        finally:
+            self.lock.release()
+
+    def dump(self, filename=LOG_FILE):
+        """append the report to filename"""
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        log_file = open(filename, 'a')
+        try:
+            log_file.write(self.report())
+        finally:
+            log_file.close()
@@ -0,0 +1,7 @@
+# -*- coding:utf-8 -*-
+"""
+benchmarks for pyroom
+
+each module can be run as a script and writes its results as JSON, so they
+can be collected per commit and compared over time
+"""
@@ -0,0 +1,1091 @@
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+a headless stand-in for gobject, gtk, pango and gtksourceview
+
+just enough of them for the editor logic to run without a display: a main
+loop with idle and timeout sources, signals, widgets that keep their state
+and draw nothing, and a text buffer with gtk's signal order, iters, marks and
+line handling. install() has to be called before anything imports gtk.
+
+timings taken on top of it measure pyroom's own code and this buffer, not
+gtk's text layout; use a real display for that
+"""
+
+import bisect
+import heapq
+import re
+import sys
+import threading
+import time
+import types
+
+PRIORITY_HIGH = -100
+PRIORITY_DEFAULT = 0
+PRIORITY_HIGH_IDLE = 100
+PRIORITY_DEFAULT_IDLE = 200
+PRIORITY_LOW = 300
+
+# Pixels per line and per character of the pretend layout
+LINE_HEIGHT = 20
+CHAR_WIDTH = 8
+SCREEN_SIZE = (1280, 800)
+
+
+# main loop
+
+class MainLoop(object):
+    """idle and timeout sources, dispatched one at a time"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sources = {}
+        self.next_id = 1
+        self.queue = []  # (priority, due, id)
+        self.level = 0
+        self.quitting = []
+
+    def add(self, priority, interval, callback, args):
+        """a source due in interval seconds, None for idle ones"""
+        self.lock.acquire()
+        try:
+            source = self.next_id
+            self.next_id += 1
+            due = 0.0
+            if interval is not None:
+                due = time.time() + interval
+            self.sources[source] = (callback, args, interval)
+            heapq.heappush(self.queue, (priority, due, source))
+            return source
+        finally:
+            self.lock.release()
+
+    def remove(self, source):
+        """drop a source, returns whether it existed"""
+        self.lock.acquire()
+        try:
+            return self.sources.pop(source, None) is not None
+        finally:
+            self.lock.release()
+
+    def ready(self):
+        """pop the source to dispatch now, or None"""
+        self.lock.acquire()
+        try:
+            now = time.time()
+            skipped = []
+            found = None
+            while self.queue:
+                entry = heapq.heappop(self.queue)
+                if entry[2] not in self.sources:
+                    continue
+                if entry[1] > now:
+                    skipped.append(entry)
+                    continue
+                found = entry
+                break
+            for entry in skipped:
+                heapq.heappush(self.queue, entry)
+            return found
+        finally:
+            self.lock.release()
+
+    def next_due(self):
+        """seconds until the next timeout, None without any"""
+        self.lock.acquire()
+        try:
+            dues = [entry[1] for entry in self.queue
+                    if entry[2] in self.sources]
+        finally:
+            self.lock.release()
+        if not dues:
+            return None
+        return max(0.0, min(dues) - time.time())
+
+    def pending(self):
+        """whether a source can be dispatched right away"""
+        due = self.next_due()
+        return due is not None and due <= 0
+
+    def iteration(self, block=True):
+        """dispatch one source, waiting for one if block"""
+        entry = self.ready()
+        while entry is None and block:
+            due = self.next_due()
+            # sources added by other threads only show up in the queue
+            time.sleep(min(due is None and 0.001 or due, 0.001))
+            entry = self.ready()
+        if entry is None:
+            return False
+        priority, due, source = entry
+        self.lock.acquire()
+        try:
+            callback, args, interval = self.sources[source]
+        finally:
+            self.lock.release()
+        if callback(*args):
+            self.lock.acquire()
+            try:
+                if source in self.sources:
+                    heapq.heappush(self.queue, (priority,
+                        time.time() + (interval or 0.0), source))
+            finally:
+                self.lock.release()
+        else:
+            self.remove(source)
+        return True
+
+    def run(self):
+        """dispatch until quit is called"""
+        self.level += 1
+        self.quitting.append(False)
+        try:
+            while not self.quitting[-1]:
+                self.iteration(True)
+        finally:
+            self.quitting.pop()
+            self.level -= 1
+
+    def quit(self):
+        """leave the innermost run"""
+        if self.quitting:
+            self.quitting[-1] = True
+
+
+loop = MainLoop()
+
+
+def idle_add(callback, *args, **kwargs):
+    return loop.add(kwargs.get('priority', PRIORITY_DEFAULT_IDLE), None,
+                    callback, args)
+
+
+def timeout_add(interval, callback, *args, **kwargs):
+    return loop.add(kwargs.get('priority', PRIORITY_DEFAULT),
+                    interval / 1000.0, callback, args)
+
+
+def timeout_add_seconds(interval, callback, *args, **kwargs):
+    return loop.add(kwargs.get('priority', PRIORITY_DEFAULT), interval,
+                    callback, args)
+
+
+def main_iteration(block=True):
+    """dispatch one source; gtk's returns True after main_quit, which
+    nothing here relies on"""
+    loop.iteration(block)
+    return False
+
+
+def io_add_watch(fd, condition, callback, *args, **kwargs):
+    # nothing is ever ready, the benchmarks do not use sockets
+    return loop.add(PRIORITY_DEFAULT, 365 * 24 * 60 * 60.0, callback, args)
+
+
+def source_remove(source):
+    return loop.remove(source)
+
+
+def threads_init():
+    pass
+
+
+# signals
+
+class GObject(object):
+    """signal connection and emission, and plain properties"""
+
+    def __init__(self, *args, **kwargs):
+        self._handlers = []
+        self._next_handler = 1
+        self._blocked = set()
+        self._properties = {}
+
+    def _connect(self, name, callback, args, after):
+        handler = self._next_handler
+        self._next_handler += 1
+        self._handlers.append((handler, name.replace('_', '-'), callback,
+                               args, after))
+        return handler
+
+    def connect(self, name, callback, *args):
+        return self._connect(name, callback, args, False)
+
+    def connect_after(self, name, callback, *args):
+        return self._connect(name, callback, args, True)
+
+    def disconnect(self, handler):
+        self._handlers = [entry for entry in self._handlers
+                          if entry[0] != handler]
+
+    handler_disconnect = disconnect
+
+    def handler_block(self, handler):
+        self._blocked.add(handler)
+
+    def handler_unblock(self, handler):
+        self._blocked.discard(handler)
+
+    def emit(self, name, *args):
+        """run the handlers, then the class handler, then the after ones;
+        an event handler returning True stops the emission"""
+        name = name.replace('_', '-')
+        event = name.endswith('-event')
+        for handler, signal, callback, extra, after in list(self._handlers):
+            if signal == name and not after and handler not in self._blocked:
+                if callback(self, *(args + extra)) and event:
+                    return True
+        default = getattr(self, 'do_' + name.replace('-', '_'), None)
+        if default is not None:
+            default(*args)
+        for handler, signal, callback, extra, after in list(self._handlers):
+            if signal == name and after and handler not in self._blocked:
+                if callback(self, *(args + extra)) and event:
+                    return True
+        return False
+
+    def set_property(self, name, value):
+        self._properties[name] = value
+
+    def get_property(self, name):
+        return self._properties.get(name)
+
+
+# widgets
+
+class Widget(GObject):
+    """a widget that keeps its state and draws nothing"""
+
+    def __init__(self, *args, **kwargs):
+        GObject.__init__(self)
+        self.children = []
+        self._properties['visible'] = False
+        self.no_show_all = False
+        self.sensitive = True
+        self.size_request = (-1, -1)
+
+    def __getattr__(self, name):
+        # set_*, modify_* and the like that only change the looks
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+    def show(self):
+        self._properties['visible'] = True
+
+    def hide(self):
+        self._properties['visible'] = False
+
+    def show_all(self):
+        if not self.no_show_all:
+            self.show()
+            for child in self.children:
+                child.show_all()
+
+    def hide_all(self):
+        self.hide()
+        for child in self.children:
+            child.hide_all()
+
+    def set_no_show_all(self, value):
+        self.no_show_all = value
+
+    def set_sensitive(self, value):
+        self.sensitive = value
+
+    def set_size_request(self, width, height):
+        self.size_request = (width, height)
+
+    def add(self, child):
+        self.children.append(child)
+
+    def pack_start(self, child, *args):
+        self.children.append(child)
+
+    pack_end = pack_start
+
+    def put(self, child, x, y):
+        self.children.append(child)
+
+    def get_children(self):
+        return list(self.children)
+
+    def destroy(self):
+        self.hide()
+
+
+class Label(Widget):
+
+    def __init__(self, text=''):
+        Widget.__init__(self)
+        self.text = text
+
+    def set_text(self, text):
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+
+class Entry(Widget):
+
+    def __init__(self, *args):
+        Widget.__init__(self)
+        self.text = ''
+
+    def set_text(self, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        if text != self.text:
+            self.text = text
+            self.emit('changed')
+
+    def get_text(self):
+        return self.text
+
+
+class Adjustment(Widget):
+
+    def __init__(self, value=0.0, lower=0.0, upper=0.0, step_incr=0.0,
+                 page_incr=0.0, page_size=0.0):
+        Widget.__init__(self)
+        self.__dict__['value'] = value
+        self.lower = lower
+        self.upper = upper
+        self.step_increment = step_incr
+        self.page_increment = page_incr
+        self.page_size = page_size
+
+    def __setattr__(self, name, value):
+        Widget.__setattr__(self, name, value)
+        if name == 'value':
+            self.emit('value-changed')
+
+    def set_value(self, value):
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+
+class ScrolledWindow(Widget):
+
+    def __init__(self, *args):
+        Widget.__init__(self)
+        self.vadjustment = Adjustment(page_size=SCREEN_SIZE[1],
+                                      step_incr=LINE_HEIGHT)
+
+    def get_vadjustment(self):
+        return self.vadjustment
+
+
+class Dialog(Widget):
+    """answers run() with the response set in responses, by title"""
+
+    responses = {}
+    default_response = -6  # RESPONSE_CANCEL
+
+    def __init__(self, title='', parent=None, flags=0, buttons=(), **kwargs):
+        Widget.__init__(self)
+        self.title = title or kwargs.get('message_format', '')
+        self.vbox = Widget()
+        self.action_area = Widget()
+        self.filename = None
+
+    def add_button(self, text, response):
+        button = Widget()
+        self.action_area.add(button)
+        return button
+
+    def run(self):
+        return self.responses.get(self.title, self.default_response)
+
+    def get_filename(self):
+        return self.filename
+
+
+class ListStore(list):
+
+    def __init__(self, *types):
+        list.__init__(self)
+
+    def clear(self):
+        del self[:]
+
+
+class Rectangle(object):
+
+    def __init__(self, x=0, y=0, width=0, height=0):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+
+# text
+
+class TextIter(object):
+    """a position in a buffer, by character offset"""
+
+    def __init__(self, buf, offset):
+        self.buf = buf
+        self.offset = offset
+
+    def copy(self):
+        return TextIter(self.buf, self.offset)
+
+    def get_buffer(self):
+        return self.buf
+
+    def get_offset(self):
+        return self.offset
+
+    def set_offset(self, offset):
+        self.offset = max(0, min(offset, self.buf.length))
+
+    def get_line(self):
+        return self.buf.line_at(self.offset)
+
+    def get_line_offset(self):
+        return self.offset - self.buf.line_start(self.get_line())
+
+    def get_char(self):
+        if self.offset >= self.buf.length:
+            return u''
+        return self.buf.slice(self.offset, self.offset + 1)
+
+    def is_start(self):
+        return self.offset == 0
+
+    def is_end(self):
+        return self.offset >= self.buf.length
+
+    def starts_line(self):
+        return self.offset == self.buf.line_start(self.get_line())
+
+    def ends_line(self):
+        return self.offset == self.buf.line_end(self.get_line())
+
+    def forward_chars(self, count):
+        start = self.offset
+        self.set_offset(self.offset + count)
+        return self.offset != start and not self.is_end()
+
+    def backward_chars(self, count):
+        start = self.offset
+        self.set_offset(self.offset - count)
+        return self.offset != start
+
+    def forward_char(self):
+        return self.forward_chars(1)
+
+    def backward_char(self):
+        return self.backward_chars(1)
+
+    def forward_line(self):
+        line = self.get_line() + 1
+        if line >= len(self.buf.lines):
+            self.offset = self.buf.length
+            return False
+        self.offset = self.buf.line_start(line)
+        return True
+
+    def forward_to_line_end(self):
+        line = self.get_line()
+        if self.offset == self.buf.line_end(line):
+            line += 1
+            if line >= len(self.buf.lines):
+                return False
+        self.offset = self.buf.line_end(line)
+        return not self.is_end()
+
+    def compare(self, other):
+        return cmp(self.offset, other.offset)
+
+    def equal(self, other):
+        return self.offset == other.offset
+
+    def in_range(self, start, end):
+        return start.offset <= self.offset < end.offset
+
+
+class TextMark(object):
+
+    def __init__(self, name, offset, left_gravity):
+        self.name = name
+        self.offset = offset
+        self.left_gravity = left_gravity
+        self.deleted = False
+
+    def get_name(self):
+        return self.name
+
+    def get_deleted(self):
+        return self.deleted
+
+
+class TextTag(GObject):
+
+    def __init__(self, name=None, **properties):
+        GObject.__init__(self)
+        self.name = name
+        self._properties.update(properties)
+
+
+class TextTagTable(object):
+
+    def __init__(self):
+        self.tags = {}
+
+    def add(self, tag):
+        self.tags[tag.name] = tag
+
+    def lookup(self, name):
+        return self.tags.get(name)
+
+
+class TextBuffer(GObject):
+    """text as a list of lines, each with its line end but the last one;
+    line start offsets are worked out on demand from the first line an edit
+    changed, so appending stays cheap"""
+
+    def __init__(self, table=None):
+        GObject.__init__(self)
+        self.lines = [u'']
+        self.starts = [0]
+        self.length = 0
+        self.modified = False
+        self.tag_table = table or TextTagTable()
+        self.marks = [TextMark('insert', 0, False),
+                      TextMark('selection_bound', 0, False)]
+        self.user_action = 0
+
+    # lines
+
+    def fix_starts(self, line):
+        """line start offsets known up to line"""
+        starts = self.starts
+        lines = self.lines
+        known = len(starts)
+        if known > line:
+            return
+        offset = starts[-1]
+        for index in xrange(known - 1, line):
+            offset += len(lines[index])
+            starts.append(offset)
+
+    def line_start(self, line):
+        self.fix_starts(line)
+        return self.starts[line]
+
+    def line_end(self, line):
+        """offset before the line end of line"""
+        text = self.lines[line]
+        end = self.line_start(line) + len(text)
+        if text.endswith(u'\n'):
+            end -= 1
+        return end
+
+    def line_at(self, offset):
+        """the line holding offset"""
+        self.fix_starts(len(self.lines) - 1)
+        return max(0, bisect.bisect_right(self.starts, offset) - 1)
+
+    def slice(self, start, end):
+        """unicode text between two offsets"""
+        if start >= end:
+            return u''
+        first = self.line_at(start)
+        last = self.line_at(end)
+        if first == last:
+            base = self.starts[first]
+            return self.lines[first][start - base:end - base]
+        pieces = [self.lines[first][start - self.starts[first]:]]
+        pieces.extend(self.lines[first + 1:last])
+        pieces.append(self.lines[last][:end - self.starts[last]])
+        return u''.join(pieces)
+
+    def edited(self, line):
+        """lines from line on moved"""
+        del self.starts[line + 1:]
+
+    # signals and their class handlers
+
+    def insert(self, text_iter, text, length=-1):
+        if not isinstance(text, unicode):
+            text = unicode(text, 'utf-8')
+        if length >= 0:
+            text = unicode(text.encode('utf-8')[:length], 'utf-8')
+        if text:
+            self.emit('insert-text', text_iter, text.encode('utf-8'),
+                      len(text.encode('utf-8')))
+
+    def do_insert_text(self, text_iter, text, length):
+        text = unicode(text, 'utf-8')
+        offset = text_iter.offset
+        line = self.line_at(offset)
+        column = offset - self.starts[line]
+        current = self.lines[line]
+        pieces = (current[:column] + text).split(u'\n')
+        tail = current[column:]
+        new_lines = [piece + u'\n' for piece in pieces[:-1]]
+        new_lines.append(pieces[-1] + tail)
+        self.lines[line:line + 1] = new_lines
+        self.edited(line)
+        self.length += len(text)
+        for mark in self.marks:
+            if (mark.offset > offset or
+                mark.offset == offset and not mark.left_gravity):
+                mark.offset += len(text)
+        text_iter.offset = offset + len(text)
+        self.emit('changed')
+        self.set_modified(True)
+
+    def insert_at_cursor(self, text, length=-1):
+        self.insert(self.get_iter_at_mark(self.get_insert()), text, length)
+
+    def delete(self, start, end):
+        if start.offset > end.offset:
+            start, end = end, start
+        if start.offset != end.offset:
+            self.emit('delete-range', start, end)
+
+    def do_delete_range(self, start, end):
+        first = self.line_at(start.offset)
+        last = self.line_at(end.offset)
+        head = self.lines[first][:start.offset - self.starts[first]]
+        tail = self.lines[last][end.offset - self.starts[last]:]
+        self.lines[first:last + 1] = [head + tail]
+        self.edited(first)
+        removed = end.offset - start.offset
+        self.length -= removed
+        for mark in self.marks:
+            if mark.offset >= end.offset:
+                mark.offset -= removed
+            elif mark.offset > start.offset:
+                mark.offset = start.offset
+        end.offset = start.offset
+        self.emit('changed')
+        self.set_modified(True)
+
+    def set_text(self, text, length=-1):
+        self.begin_user_action()
+        self.delete(self.get_start_iter(), self.get_end_iter())
+        self.insert(self.get_start_iter(), text, length)
+        self.end_user_action()
+
+    def get_modified(self):
+        return self.modified
+
+    def set_modified(self, modified):
+        modified = bool(modified)
+        if modified != self.modified:
+            self.modified = modified
+            self.emit('modified-changed')
+
+    def begin_user_action(self):
+        self.user_action += 1
+        if self.user_action == 1:
+            self.emit('begin-user-action')
+
+    def end_user_action(self):
+        self.user_action -= 1
+        if not self.user_action:
+            self.emit('end-user-action')
+
+    # text
+
+    def get_text(self, start, end, include_hidden_chars=True):
+        if start.offset > end.offset:
+            start, end = end, start
+        return self.slice(start.offset, end.offset).encode('utf-8')
+
+    get_slice = get_text
+
+    def get_char_count(self):
+        return self.length
+
+    def get_line_count(self):
+        return len(self.lines)
+
+    # iters
+
+    def get_iter_at_offset(self, offset):
+        if offset < 0 or offset > self.length:
+            offset = self.length
+        return TextIter(self, offset)
+
+    def get_iter_at_line(self, line):
+        line = max(0, min(line, len(self.lines) - 1))
+        return TextIter(self, self.line_start(line))
+
+    def get_iter_at_line_offset(self, line, column):
+        text_iter = self.get_iter_at_line(line)
+        text_iter.offset += column
+        return text_iter
+
+    def get_start_iter(self):
+        return TextIter(self, 0)
+
+    def get_end_iter(self):
+        return TextIter(self, self.length)
+
+    def get_bounds(self):
+        return self.get_start_iter(), self.get_end_iter()
+
+    # marks
+
+    def create_mark(self, name, where, left_gravity=False):
+        mark = TextMark(name, where.offset, left_gravity)
+        self.marks.append(mark)
+        return mark
+
+    def get_mark(self, name):
+        for mark in self.marks:
+            if mark.name == name:
+                return mark
+        return None
+
+    def get_insert(self):
+        return self.marks[0]
+
+    def get_selection_bound(self):
+        return self.marks[1]
+
+    def move_mark(self, mark, where):
+        mark.offset = where.offset
+
+    def move_mark_by_name(self, name, where):
+        self.move_mark(self.get_mark(name), where)
+
+    def delete_mark(self, mark):
+        mark.deleted = True
+        self.marks.remove(mark)
+
+    def get_iter_at_mark(self, mark):
+        return TextIter(self, mark.offset)
+
+    def place_cursor(self, where):
+        self.select_range(where, where)
+
+    def select_range(self, insert, bound):
+        self.marks[0].offset = insert.offset
+        self.marks[1].offset = bound.offset
+
+    def get_selection_bounds(self):
+        insert, bound = self.marks[0].offset, self.marks[1].offset
+        if insert == bound:
+            return ()
+        return (TextIter(self, min(insert, bound)),
+                TextIter(self, max(insert, bound)))
+
+    # tags, which change nothing here
+
+    def get_tag_table(self):
+        return self.tag_table
+
+    def create_tag(self, name=None, **properties):
+        tag = TextTag(name, **properties)
+        self.tag_table.add(tag)
+        return tag
+
+    def apply_tag(self, tag, start, end):
+        pass
+
+    def remove_tag(self, tag, start, end):
+        pass
+
+    def apply_tag_by_name(self, name, start, end):
+        pass
+
+    def remove_tag_by_name(self, name, start, end):
+        pass
+
+    def remove_all_tags(self, start, end):
+        pass
+
+
+class SourceBuffer(TextBuffer):
+    """no undo history, the benchmarks never undo"""
+
+    def __init__(self, table=None):
+        TextBuffer.__init__(self, table)
+        self.not_undoable = 0
+
+    def begin_not_undoable_action(self):
+        self.not_undoable += 1
+
+    def end_not_undoable_action(self):
+        self.not_undoable -= 1
+
+    def can_undo(self):
+        return False
+
+    def can_redo(self):
+        return False
+
+    def undo(self):
+        pass
+
+    def redo(self):
+        pass
+
+    def set_check_brackets(self, value):
+        pass
+
+    def set_highlight(self, value):
+        pass
+
+
+class TextView(Widget):
+
+    def __init__(self, buf=None):
+        Widget.__init__(self)
+        self.buf = buf or SourceBuffer()
+        self.editable = True
+        self.show_line_numbers = False
+
+    def set_buffer(self, buf):
+        self.buf = buf
+
+    def get_buffer(self):
+        return self.buf
+
+    def set_editable(self, editable):
+        self.editable = editable
+
+    def get_editable(self):
+        return self.editable
+
+    def set_show_line_numbers(self, show):
+        self.show_line_numbers = bool(show)
+
+    def get_show_line_numbers(self):
+        return self.show_line_numbers
+
+    def get_visible_rect(self):
+        return Rectangle(0, 0, SCREEN_SIZE[0], SCREEN_SIZE[1])
+
+    def get_iter_at_location(self, x, y):
+        text_iter = self.buf.get_iter_at_line(y / LINE_HEIGHT)
+        line_end = text_iter.copy()
+        if not line_end.ends_line():
+            line_end.forward_to_line_end()
+        text_iter.offset = min(text_iter.offset + x / CHAR_WIDTH,
+                               line_end.offset)
+        return text_iter
+
+    def get_line_at_y(self, y):
+        line = y / LINE_HEIGHT
+        return self.buf.get_iter_at_line(line), line * LINE_HEIGHT
+
+    def scroll_to_mark(self, *args):
+        pass
+
+
+SourceView = TextView
+
+
+# colors and fonts
+
+COLOR_NAMES = {
+    'black': '#000000', 'white': '#ffffff', 'red': '#ff0000',
+    'green': '#00ff00', 'blue': '#0000ff', 'yellow': '#ffff00',
+    'grey': '#bebebe', 'gray': '#bebebe',
+}
+HEX_RE = re.compile(r'^#([0-9a-fA-F]+)$')
+
+
+class Color(object):
+
+    def __init__(self, red=0, green=0, blue=0, pixel=0):
+        self.red = int(red)
+        self.green = int(green)
+        self.blue = int(blue)
+        self.pixel = pixel
+
+    def to_string(self):
+        return '#%04x%04x%04x' % (self.red, self.green, self.blue)
+
+
+def color_parse(spec):
+    spec = COLOR_NAMES.get(spec.lower(), spec)
+    match = HEX_RE.match(spec)
+    if not match or len(match.group(1)) % 3:
+        raise ValueError('unable to parse colour specification')
+    digits = match.group(1)
+    width = len(digits) / 3
+    scale = 65535.0 / (16 ** width - 1)
+    return Color(*[int(int(digits[index * width:(index + 1) * width], 16)
+                       * scale) for index in range(3)])
+
+
+class FontDescription(object):
+
+    def __init__(self, description=''):
+        self.description = description
+
+    def to_string(self):
+        return self.description
+
+
+class Screen(object):
+
+    def get_root_window(self):
+        return self
+
+    def get_pointer(self):
+        return 0, 0, 0
+
+    def get_monitor_at_point(self, x, y):
+        return 0
+
+    def get_monitor_geometry(self, monitor):
+        return Rectangle(0, 0, *SCREEN_SIZE)
+
+    def get_width(self):
+        return SCREEN_SIZE[0]
+
+    def get_height(self):
+        return SCREEN_SIZE[1]
+
+
+class Keymap(object):
+
+    def get_entries_for_keyval(self, keyval):
+        # the keyval stands for its own hardware keycode
+        return ((keyval, 0, 0),)
+
+
+class GladeTree(object):
+    """every widget asked for exists, as a dialog"""
+
+    def __init__(self):
+        self.widgets = {}
+
+    def get_widget(self, name):
+        if name not in self.widgets:
+            self.widgets[name] = Dialog(name)
+        return self.widgets[name]
+
+    def signal_autoconnect(self, handlers):
+        pass
+
+
+# modules
+
+KEYSYMS = {
+    'Escape': 0xff1b, 'Return': 0xff0d, 'KP_Enter': 0xff8d,
+    'Page_Up': 0xff55, 'Page_Down': 0xff56, 'Tab': 0xff09,
+    'BackSpace': 0xff08, 'Delete': 0xffff,
+}
+for letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+    KEYSYMS[letter] = ord(letter)
+    KEYSYMS[letter.lower()] = ord(letter.lower())
+
+
+def module(name, **attributes):
+    """a module object holding attributes"""
+    new_module = types.ModuleType(name)
+    new_module.__dict__.update(attributes)
+    return new_module
+
+
+def build_modules():
+    """the fake modules, by name"""
+    gobject = module('gobject',
+        idle_add=idle_add, timeout_add=timeout_add,
+        timeout_add_seconds=timeout_add_seconds, io_add_watch=io_add_watch,
+        source_remove=source_remove, threads_init=threads_init,
+        GObject=GObject, MainLoop=MainLoop,
+        PRIORITY_HIGH=PRIORITY_HIGH, PRIORITY_DEFAULT=PRIORITY_DEFAULT,
+        PRIORITY_HIGH_IDLE=PRIORITY_HIGH_IDLE,
+        PRIORITY_DEFAULT_IDLE=PRIORITY_DEFAULT_IDLE,
+        PRIORITY_LOW=PRIORITY_LOW,
+        IO_IN=1, IO_OUT=4, IO_PRI=2, IO_ERR=8, IO_HUP=16)
+
+    screen = Screen()
+    keymap = Keymap()
+    gdk = module('gtk.gdk',
+        Color=Color, color_parse=color_parse, Rectangle=Rectangle,
+        screen_get_default=lambda: screen,
+        screen_width=lambda: SCREEN_SIZE[0],
+        screen_height=lambda: SCREEN_SIZE[1],
+        keymap_get_default=lambda: keymap,
+        SHIFT_MASK=1, LOCK_MASK=2, CONTROL_MASK=4, MOD1_MASK=8,
+        SCROLL_UP=0, SCROLL_DOWN=1, SCROLL_LEFT=2, SCROLL_RIGHT=3,
+        GRAVITY_CENTER=5)
+    keysyms = module('gtk.keysyms', **KEYSYMS)
+    glade = module('gtk.glade',
+        xml_new_from_buffer=lambda buffer, size, root=None: GladeTree(),
+        XML=lambda *args: GladeTree())
+
+    gtk = module('gtk',
+        gdk=gdk, keysyms=keysyms, glade=glade,
+        main=loop.run, main_quit=loop.quit,
+        main_level=lambda: loop.level,
+        events_pending=loop.pending,
+        main_iteration=main_iteration, main_iteration_do=main_iteration,
+        rc_parse_string=lambda string: None,
+        Widget=Widget, Window=Widget, Fixed=Widget, VBox=Widget,
+        HBox=Widget, EventBox=Widget, Frame=Widget, Button=Widget,
+        TreeView=Widget, TreeViewColumn=Widget, CellRendererText=Widget,
+        Label=Label, Entry=Entry, Adjustment=Adjustment,
+        ScrolledWindow=ScrolledWindow, Dialog=Dialog, MessageDialog=Dialog,
+        FileChooserDialog=Dialog, ListStore=ListStore,
+        TextView=TextView, TextBuffer=TextBuffer, TextIter=TextIter,
+        TextMark=TextMark, TextTag=TextTag, TextTagTable=TextTagTable,
+        WINDOW_TOPLEVEL=0, WIN_POS_CENTER=1, WRAP_WORD=2, JUSTIFY_LEFT=0,
+        POLICY_ALWAYS=0, POLICY_AUTOMATIC=1, POLICY_NEVER=2, SHADOW_IN=1,
+        RESIZE_PARENT=0, STATE_NORMAL=0, STATE_ACTIVE=1, STATE_PRELIGHT=2,
+        STATE_SELECTED=3, STATE_INSENSITIVE=4,
+        DIALOG_MODAL=1, DIALOG_DESTROY_WITH_PARENT=2,
+        MESSAGE_INFO=0, MESSAGE_WARNING=1, MESSAGE_QUESTION=2,
+        MESSAGE_ERROR=3, BUTTONS_NONE=0, BUTTONS_OK=1,
+        FILE_CHOOSER_ACTION_OPEN=0, FILE_CHOOSER_ACTION_SAVE=1,
+        RESPONSE_NONE=-1, RESPONSE_REJECT=-2, RESPONSE_ACCEPT=-3,
+        RESPONSE_DELETE_EVENT=-4, RESPONSE_OK=-5, RESPONSE_CANCEL=-6,
+        RESPONSE_CLOSE=-7, RESPONSE_YES=-8, RESPONSE_NO=-9,
+        STOCK_OK='gtk-ok', STOCK_CANCEL='gtk-cancel', STOCK_OPEN='gtk-open',
+        STOCK_SAVE='gtk-save', STOCK_CLOSE='gtk-close')
+
+    pango = module('pango', FontDescription=FontDescription,
+                   WRAP_WORD=0, SCALE=1024)
+    gtksourceview = module('gtksourceview', SourceBuffer=SourceBuffer,
+                           SourceView=SourceView)
+    return {
+        'gobject': gobject,
+        'gtk': gtk,
+        'gtk.gdk': gdk,
+        'gtk.keysyms': keysyms,
+        'gtk.glade': glade,
+        'pango': pango,
+        'gtksourceview': gtksourceview,
+    }
+
+
+def install():
+    """make the fake modules the ones imported"""
+    loaded = [name for name in ('gtk', 'gobject', 'gtksourceview')
+              if name in sys.modules]
+    if loaded:
+        raise RuntimeError('%s already imported' % ', '.join(loaded))
+    sys.modules.update(build_modules())
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+editor hot path benchmark
+
+builds a BasicEdit in this process, either on the fake gtk of
+benchmarks.fakegtk or on the real one under a virtual X server, generates
+documents of the given sizes and times the editor operations on each of
+them, then writes the timings as JSON
+
+    python -m benchmarks.hotpaths [--backend=fake|xvfb] [--sizes=1K,1M,...]
+                                  [--repeat=N] [--output=FILE]
+
+documents at or above the pager threshold of the preferences are opened
+read-only; saving and autosaving them are skipped
+"""
+
+import gettext
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+from benchmarks.startup import ROOT, VirtualDisplay, median
+
+DEFAULT_SIZES = '1K,64K,1M,16M,500M'
+UNITS = {'': 1, 'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+BLOCK_SIZE = 1024 * 1024  # Generated text repeats past this size
+WORD_COUNT_CALLS = 1000
+TIMEOUT = 600  # Seconds an operation may take before giving up
+
+WORDS = (u'the a of and to in it was she he they room page chapter night '
+         u'morning river window letter quiet slowly never always without '
+         u'before after between don\'t it\'s wasn\'t café naïve déjà '
+         u'rôle Zoë writing written remembered garden kitchen 1908 42').split()
+
+
+def parse_size(text):
+    """bytes in 1K, 16M and the like"""
+    text = text.strip().upper()
+    unit = text[-1:] if text[-1:] in UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * UNITS[unit])
+
+
+def make_block(size, seed):
+    """utf-8 prose of about size bytes, one paragraph per line"""
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size:
+        words = [rng.choice(WORDS) for count in range(rng.randint(20, 200))]
+        paragraph = (u' '.join(words).capitalize() + u'.\n\n').encode('utf-8')
+        paragraphs.append(paragraph)
+        total += len(paragraph)
+    return ''.join(paragraphs)
+
+
+def make_document(filename, size, seed=0):
+    """write a document of size bytes, ending with a whole line"""
+    block = make_block(min(size, BLOCK_SIZE), seed)
+    out_file = open(filename, 'wb')
+    try:
+        written = 0
+        while written + len(block) <= size:
+            out_file.write(block)
+            written += len(block)
+        rest = block[:size - written]
+        out_file.write(rest[:rest.rfind('\n') + 1])
+    finally:
+        out_file.close()
+
+
+def summarize(durations):
+    """seconds taken by a series of runs"""
+    return {
+        'runs': len(durations),
+        'min': min(durations),
+        'median': median(durations),
+        'max': max(durations),
+    }
+
+
+def git_commit():
+    """the commit benchmarked, None outside a checkout"""
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=open(os.devnull, 'w'))
+        commit = process.communicate()[0].strip()
+    except OSError:
+        return None
+    return commit or None
+
+
+class HotPaths(object):
+    """a BasicEdit and the operations timed on it"""
+
+    def __init__(self, style, repeat):
+        # imported here, once the backend is in place
+        import gobject
+        import gtk
+        from PyRoom import autosave, saver
+        from PyRoom.basic_edit import BasicEdit
+        from PyRoom.preferences import PyroomConfig
+
+        self.gtk = gtk
+        self.autosave = autosave
+        self.saver = saver
+        self.repeat = repeat
+        gobject.threads_init()
+        self.edit = BasicEdit(style=style, pyroom_config=PyroomConfig())
+        # edits must not set off autosaves of their own
+        autosave.autosave_time = 0
+        self.drain()
+
+    def drain(self):
+        """dispatch whatever the main loop has ready"""
+        while self.gtk.events_pending():
+            self.gtk.main_iteration(False)
+
+    def run_until(self, done):
+        """run the main loop until done() holds"""
+        deadline = time.time() + TIMEOUT
+        while not done():
+            if time.time() > deadline:
+                raise SystemExit('gave up waiting after %d seconds' % TIMEOUT)
+            if self.gtk.events_pending():
+                self.gtk.main_iteration(False)
+            else:
+                time.sleep(0.0005)
+
+    def timed(self, function, prepare=None):
+        """durations of repeat calls of function, prepare() running untimed
+        before each"""
+        durations = []
+        for run in range(self.repeat):
+            if prepare:
+                prepare()
+            start = time.time()
+            function()
+            durations.append(time.time() - start)
+        return summarize(durations)
+
+    def open_file(self, filename):
+        """open filename and wait for it to be loaded"""
+        self.edit.open_file_no_chooser(filename)
+        buf = self.edit.buffers[self.edit.current]
+        self.run_until(lambda: not buf.loader)
+        self.drain()
+        return buf
+
+    def touch(self, buf):
+        """an edit, so buf needs saving and autosaving"""
+        buf.insert(buf.get_end_iter(), u'x')
+
+    def document(self, filename):
+        """time the operations on one document, returns the timings"""
+        timings = {}
+        durations = []
+        for run in range(self.repeat):
+            if run:
+                self.edit.close_buffer()
+                self.drain()
+            start = time.time()
+            buf = self.open_file(filename)
+            durations.append(time.time() - start)
+        timings['open_file_no_chooser'] = summarize(durations)
+        # the last one stays open for the other operations and the buffer
+        # switching
+        timings['word_count'] = self.time_word_count(buf)
+        if buf.pager:
+            start = time.time()
+            self.run_until(lambda: buf.pager.index.done)
+            timings['pager_index'] = summarize([time.time() - start])
+        else:
+            timings['save_file'] = self.timed(self.save_file,
+                                              lambda: self.touch(buf))
+            timings['autosave.timeout'] = self.timed(
+                lambda: self.autosave_timeout(buf), lambda: self.touch(buf))
+        timings['apply_style'] = self.timed(self.apply_style)
+        return buf, timings
+
+    def time_word_count(self, buf):
+        """word_count is constant time, call it often enough to measure"""
+        word_count = self.edit.word_count
+        calls = range(WORD_COUNT_CALLS)
+
+        def count():
+            for call in calls:
+                word_count(buf)
+        timing = self.timed(count)
+        for key in ('min', 'median', 'max'):
+            timing[key] /= WORD_COUNT_CALLS
+        timing['calls'] = WORD_COUNT_CALLS
+        return timing
+
+    def save_file(self):
+        """save the current buffer and wait for the save to be reported"""
+        self.edit.save_file()
+        self.saver.wait()
+        self.drain()
+
+    def autosave_timeout(self, buf):
+        """run the autosave timer and wait for the snapshot to be stored"""
+        self.autosave.autosave_time = 1
+        try:
+            self.autosave.timeout(self.edit)
+        finally:
+            self.autosave.autosave_time = 0
+        self.run_until(lambda: not buf.autosave_pending)
+        self.drain()
+
+    def apply_style(self):
+        """restyle the window and let it settle"""
+        self.edit.gui.apply_style()
+        self.drain()
+
+    def switching(self):
+        """time going around the buffers both ways"""
+        count = len(self.edit.buffers)
+
+        def around(step):
+            for index in range(count):
+                step()
+                self.drain()
+
+        timings = {}
+        for name in ('next_buffer', 'prev_buffer'):
+            timing = self.timed(lambda: around(getattr(self.edit, name)))
+            for key in ('min', 'median', 'max'):
+                timing[key] /= count
+            timing['buffers'] = count
+            timings[name] = timing
+        return timings
+
+    def dialog_quit(self, buf):
+        """time the quit check with a modified buffer, which shows the
+        quit dialog instead of quitting"""
+        self.touch(buf)
+        timing = self.timed(self.edit.dialog_quit,
+                            lambda: self.edit.get_quit_dialog().hide())
+        self.edit.get_quit_dialog().hide()
+        self.drain()
+        return timing
+
+
+def run(options, sizes, folder):
+    """the results of a benchmark run"""
+    bench = HotPaths(options.style, options.repeat)
+    results = {
+        'backend': options.backend,
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'time': time.time(),
+        'repeat': options.repeat,
+        'documents': {},
+    }
+    buffers = []
+    for name, size in sizes:
+        filename = os.path.join(folder, 'document-%s.txt' % name)
+        make_document(filename, size)
+        sys.stderr.write('%s...\n' % name)
+        buf, timings = bench.document(filename)
+        buffers.append(buf)
+        results['documents'][name] = {
+            'bytes': os.path.getsize(filename),
+            'paged': bool(buf.pager),
+            'timings': timings,
+        }
+    results['buffers'] = bench.switching()
+    editable = [buf for buf in buffers if not buf.pager] or buffers
+    results['buffers']['dialog_quit'] = bench.dialog_quit(editable[0])
+    return results
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--backend', type='choice', choices=['fake', 'xvfb'],
+                      default='fake',
+                      help='fake gtk in process, or gtk on Xvfb')
+    parser.add_option('--display',
+                      help='with the xvfb backend, use this X display '
+                           'instead of starting Xvfb')
+    parser.add_option('--sizes', default=DEFAULT_SIZES,
+                      help='document sizes, default %s' % DEFAULT_SIZES)
+    parser.add_option('--repeat', type='int', default=5,
+                      help='runs of each operation')
+    parser.add_option('--style', default='green', help='theme to apply')
+    parser.add_option('--output', help='write the results here, not stdout')
+    (options, args) = parser.parse_args()
+    try:
+        sizes = [(text.strip(), parse_size(text))
+                 for text in options.sizes.split(',')]
+    except ValueError:
+        parser.error('sizes are numbers of bytes, K or M')
+
+    home = tempfile.mkdtemp(prefix='pyroom-bench-')
+    os.mkdir(os.path.join(home, 'runtime'), 0700)
+    # before xdg is imported, it reads them once
+    os.environ.update({
+        'HOME': home,
+        'XDG_CONFIG_HOME': os.path.join(home, 'config'),
+        'XDG_DATA_HOME': os.path.join(home, 'data'),
+        'XDG_RUNTIME_DIR': os.path.join(home, 'runtime'),
+    })
+    server = None
+    if options.backend == 'fake':
+        from benchmarks import fakegtk
+        fakegtk.install()
+    elif options.display:
+        os.environ['DISPLAY'] = options.display
+    else:
+        server = VirtualDisplay()
+        os.environ['DISPLAY'] = server.display
+    gettext.install('pyroom')
+    try:
+        results = run(options, sizes, home)
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(home)
+    if options.output:
+        out_file = open(options.output, 'w')
+    else:
+        out_file = sys.stdout
+    json.dump(results, out_file, indent=2, sort_keys=True)
+    out_file.write('\n')
+
+if __name__ == '__main__':
+    main()
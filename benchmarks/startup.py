@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# -----------------------------------------------------------------------------
+# PyRoom - A clone of WriteRoom
+# Copyright (c) 2007 Nicolas P. Rougier & NoWhereMan
+# Copyright (c) 2008 The Pyroom Team - See AUTHORS file for more information
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+# -----------------------------------------------------------------------------
+
+"""
+cold and warm startup benchmark
+
+starts pyroom over and over under a virtual X server (Xvfb, unless --display
+is given), each time with the startup trace enabled and set to quit after the
+first expose, and writes the collected reports with per-phase medians as JSON
+
+    python -m benchmarks.startup [--cold=N] [--warm=N] [--output=FILE] [files]
+
+cold runs drop the page cache first, which needs root; they are skipped
+otherwise
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAUNCHER = os.path.join(ROOT, 'pyroom')
+
+
+class VirtualDisplay(object):
+    """an Xvfb server on the first free display number"""
+
+    def __init__(self):
+        number = 99
+        while os.path.exists('/tmp/.X%d-lock' % number):
+            number += 1
+        self.display = ':%d' % number
+        devnull = open(os.devnull, 'w')
+        self.process = subprocess.Popen(['Xvfb', self.display, '-screen', '0',
+            '1280x800x24', '-nolisten', 'tcp'], stdout=devnull, stderr=devnull)
+        socket = '/tmp/.X11-unix/X%d' % number
+        deadline = time.time() + 10
+        while not os.path.exists(socket):
+            if time.time() > deadline or self.process.poll() is not None:
+                self.stop()
+                raise SystemExit('Xvfb did not start on %s' % self.display)
+            time.sleep(0.05)
+
+    def stop(self):
+        """shut the server down"""
+        if self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+
+
+def drop_caches():
+    """empty the page cache, returns False without the rights to"""
+    subprocess.call(['sync'])
+    try:
+        control = open('/proc/sys/vm/drop_caches', 'w')
+        control.write('3\n')
+        control.close()
+    except IOError:
+        return False
+    return True
+
+
+def run_once(python, display, home, files):
+    """start pyroom once and return its startup report"""
+    handle, report_file = tempfile.mkstemp(suffix='.json')
+    os.close(handle)
+    env = dict(os.environ)
+    env.update({
+        'DISPLAY': display,
+        'HOME': home,
+        'XDG_CONFIG_HOME': os.path.join(home, 'config'),
+        'XDG_DATA_HOME': os.path.join(home, 'data'),
+        'XDG_RUNTIME_DIR': os.path.join(home, 'runtime'),
+        'PYROOM_STARTUP_TRACE': report_file,
+        'PYROOM_STARTUP_TRACE_QUIT': '1',
+    })
+    start = time.time()
+    status = subprocess.call([python, LAUNCHER, '--new-instance'] + files,
+                             env=env)
+    wall = time.time() - start
+    try:
+        report = json.load(open(report_file))
+    except ValueError:
+        raise SystemExit('pyroom exited with %d without a report' % status)
+    finally:
+        os.unlink(report_file)
+    report['wall'] = wall
+    return report
+
+
+def median(values):
+    """median of a non empty list"""
+    values = sorted(values)
+    middle = len(values) / 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def summarize(reports):
+    """median wall time and phase durations of a series of runs"""
+    if not reports:
+        return {}
+    phases = {}
+    for report in reports:
+        for phase in report['phases']:
+            phases.setdefault(phase['name'], []).append(phase['duration'])
+    return {
+        'runs': len(reports),
+        'wall': median([report['wall'] for report in reports]),
+        'elapsed': median([report['elapsed'] for report in reports]),
+        'phases': dict([(name, median(durations))
+                        for name, durations in phases.items()]),
+    }
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] [file1] [file2]...')
+    parser.add_option('--cold', type='int', default=3,
+                      help='runs after dropping the page cache')
+    parser.add_option('--warm', type='int', default=10,
+                      help='runs with warm caches')
+    parser.add_option('--python', default=sys.executable,
+                      help='interpreter to run pyroom with')
+    parser.add_option('--display',
+                      help='use this X display instead of starting Xvfb')
+    parser.add_option('--output', help='write the results here, not stdout')
+    (options, files) = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix='pyroom-bench-')
+    os.mkdir(os.path.join(home, 'runtime'), 0700)
+    server = None
+    if options.display:
+        display = options.display
+    else:
+        server = VirtualDisplay()
+        display = server.display
+    results = {'cold': [], 'warm': []}
+    try:
+        # creates the configuration, which is not part of a normal startup
+        run_once(options.python, display, home, files)
+        for run in range(options.cold):
+            if not drop_caches():
+                sys.stderr.write('cannot drop caches, skipping cold runs\n')
+                break
+            results['cold'].append(run_once(options.python, display, home,
+                                            files))
+        for run in range(options.warm):
+            results['warm'].append(run_once(options.python, display, home,
+                                            files))
+    finally:
+        if server is not None:
+            server.stop()
+        shutil.rmtree(home)
+    results['summary'] = {
+        'cold': summarize(results['cold']),
+        'warm': summarize(results['warm']),
+    }
+    if options.output:
+        out_file = open(options.output, 'w')
+    else:
+        out_file = sys.stdout
+    json.dump(results, out_file, indent=2, sort_keys=True)
+    out_file.write('\n')
+
+if __name__ == '__main__':
+    main()